@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+import asyncio
+import functools
+import threading
+
+from .engine import PlayEngine
+from .scenarios import scenario_cache
+
+
+class AsyncPlayEngine(PlayEngine):
+    """ asyncio based YAML executor.
+
+        Command providers may implement ``async def command_<type>``
+        methods that will be awaited; regular (sync) command methods
+        are executed in a thread pool so they don't block the event loop
+        and many scenarios can be driven concurrently by one worker.
+
+        The sync API (``execute``, ``execute_command``, etc) is still
+        available so sync providers may keep executing sub commands.
+    """
+
+    def __init__(self, request, variables, executor=None):
+        """ The executor should be initialized with:
+            * **request**. A pytest ``request`` fixture
+            * **variables**. A dictionary that wil be used for parametrize
+              commands
+            * **executor**. An optional ``concurrent.futures`` executor
+              for sync command methods (default: the event loop one)
+        """
+        super(AsyncPlayEngine, self).__init__(request, variables)
+        self.executor = executor
+        self._loop = None
+        self._loop_thread = None
+
+    def fork(self, variables, share_teardown=True):
+        """ Return a new engine sharing the sync methods executor too """
+        engine = super(AsyncPlayEngine, self).fork(
+            variables, share_teardown=share_teardown)
+        engine.executor = self.executor
+        return engine
+
+    async def execute_raw_async(self, data, extra_variables={}):
+        """ Execute raw yaml-like file contents """
+        if extra_variables:
+            self.update_variables(extra_variables)
+        steps = scenario_cache.parse(data).documents[-1]
+        self.prepare(steps)
+        await self.execute_async(steps)
+
+    async def execute_async(self, data, extra_variables={}):
+        """ Execute parsed yaml-like file contents """
+        if extra_variables:
+            self.update_variables(extra_variables)
+        for step in data:
+            await self.execute_command_async(step)
+
+    async def execute_command_async(self, command, **kwargs):
+        """ Execute single command awaiting async command methods """
+        self._loop = asyncio.get_event_loop()
+        self._loop_thread = threading.get_ident()
+        if self._is_skipped(command):
+            return None
+        return_value = None
+        command, method = self._prepare_command(command)
+
+        timer = self.start_timer()
+        try:
+            if asyncio.iscoroutinefunction(method):
+                return_value = await method(command, **kwargs)
+            else:
+                return_value = await self._loop.run_in_executor(
+                    self.executor,
+                    functools.partial(method, command, **kwargs))
+        except Exception:
+            self._command_failed(command)
+            raise
+        finally:
+            self._command_executed(command, timer.stop())
+        return return_value
+
+    def _call_command_method(self, method, command, kwargs):
+        """ Invoke a provider command method from sync code """
+        if not asyncio.iscoroutinefunction(method):
+            return method(command, **kwargs)
+        loop = self._loop
+        if loop is not None and loop.is_running():
+            if threading.get_ident() == self._loop_thread:
+                raise RuntimeError(
+                    'Cannot execute an async command synchronously from '
+                    'the event loop thread, use execute_command_async',
+                    command)
+            # sync provider running in the thread pool
+            return asyncio.run_coroutine_threadsafe(
+                method(command, **kwargs), loop).result()
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(method(command, **kwargs))
+        finally:
+            loop.close()
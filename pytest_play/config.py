@@ -11,3 +11,10 @@ except ImportError:
     PYTEST_STATSD = False
 else:
     PYTEST_STATSD = True
+
+try:
+    __import__('yaml').CSafeLoader
+except AttributeError:
+    LIBYAML = False
+else:
+    LIBYAML = True
@@ -4,12 +4,33 @@ import json
 import re
 import datetime
 import logging
-import yaml
-import pkg_resources
-import time
+from contextlib import contextmanager
+from functools import lru_cache
 from zope import component
 from zope.interface import Interface
+from zope.interface.registry import Components
 from parametrizer import Parametrizer
+try:
+    from importlib.metadata import entry_points
+except ImportError:  # python < 3.8
+    from importlib_metadata import entry_points
+from .expressions import (
+    compile_expression,
+    make_namespace,
+)
+from .plan import (
+    PlanCache,
+    compile_plan,
+    has_placeholder,
+    substitute,
+)
+from .scenarios import scenario_cache
+from .timing import (
+    Timer,
+    get_timing_sink,
+)
+from .waits import WakeSignal
+from .yaml_backend import yaml_backend
 
 
 logger = logging.getLogger(__name__)
@@ -19,6 +40,19 @@ class ICommandProvider(Interface):
     """ Marker for pytest play command provider """
 
 
+@lru_cache(maxsize=None)
+def get_provider_factories():
+    """ Discover ``playcommands`` entry points (once per process) and
+        return a mapping of provider names and provider factories
+    """
+    eps = entry_points()
+    if hasattr(eps, 'select'):
+        eps = eps.select(group='playcommands')
+    else:
+        eps = eps.get('playcommands', [])
+    return dict((entrypoint.name, entrypoint.load()) for entrypoint in eps)
+
+
 class PlayEngine(object):
     """ YAML executor """
 
@@ -36,6 +70,21 @@ class PlayEngine(object):
         'float': float,
         }
 
+    # render commands through compiled plans instead of the legacy
+    # yaml.dump + parametrize + yaml.safe_load round-trip
+    compile_commands = True
+
+    # measure commands CPU time too (``_cpu_elapsed`` variables)
+    measure_cpu_time = False
+
+    # record commands elapsed time as metrics (``timing.AutoMetrics``)
+    auto_metrics = None
+
+    # register instantiated command providers in the global site manager
+    # too (the last instantiated wins) for third party code looking them
+    # up with ``component.queryUtility``. Forked engines don't
+    register_globally = True
+
     def __init__(self, request, variables):
         """ The executor should be initialized with:
             * **request**. A pytest ``request`` fixture that will be used
@@ -45,11 +94,37 @@ class PlayEngine(object):
         """
         self.request = request
         self.variables = variables
-        self.gsm = component.getGlobalSiteManager()
+        # engine local registry, falling back to the global site manager
+        # for utilities registered by third party code
+        self.gsm = Components(
+            'pytest-play', bases=(component.getGlobalSiteManager(),))
+        self._plans = PlanCache()
+        self._defaults = {}
+        self._factories = {}
+        self._providers = {}
+        self.timing_sink = get_timing_sink()
+        self.wake_signal = WakeSignal()
 
         self.register_plugins()
         self._teardown = []
 
+    def fork(self, variables, share_teardown=True):
+        """ Return a new engine with its own variables sharing request,
+            command providers factories and (optionally) teardown
+            callbacks with this one (e.g., for executing commands
+            concurrently)
+        """
+        engine = self.__class__(self.request, variables)
+        engine._factories = dict(self._factories)
+        engine.timing_sink = self.timing_sink
+        engine.wake_signal = self.wake_signal
+        engine.measure_cpu_time = self.measure_cpu_time
+        engine.auto_metrics = self.auto_metrics
+        engine.register_globally = False
+        if share_teardown:
+            engine._teardown = self._teardown
+        return engine
+
     def register_teardown_callback(self, callback):
         """ Register teardown callback """
         if callback not in self._teardown:
@@ -63,6 +138,11 @@ class PlayEngine(object):
             except Exception:
                 pass
 
+    def wake(self):
+        """ Wake up commands waiting for a condition (e.g., a provider
+            receiving a message the condition depends on) """
+        self.wake_signal.notify()
+
     def get_file_contents(self, *tokens):
         """ Return file contents """
         data = ''
@@ -72,11 +152,28 @@ class PlayEngine(object):
             data = file_obj.read()
         return data
 
+    def get_scenario(self, *tokens):
+        """ Return the cached parsed scenario for the given file path """
+        return scenario_cache.get(os.path.join(*tokens))
+
     @property
     def context(self):
-        context = self._context
-        context['variables'] = self.variables
-        return context
+        return self.namespace()
+
+    def namespace(self, **local_vars):
+        """ Evaluation namespace layering builtins, variables and
+            the given local variables """
+        return make_namespace(self._context, self.variables, local_vars)
+
+    def evaluate(self, expression, **local_vars):
+        """ Evaluate a python expression (compiled once) against
+            variables and the given local variables.
+
+            Unlike executing a python ``exec`` command nothing is
+            logged or tracked (``_elapsed`` is left untouched).
+        """
+        return compile_expression(expression).eval(
+            self.namespace(**local_vars))
 
     def parametrize(self, data):
         """ Parametrize data """
@@ -86,9 +183,32 @@ class PlayEngine(object):
 
     def _yaml_loads(self, data):
         """ returns parametrized yaml dumps """
-        return yaml.safe_load(
+        return yaml_backend.load(
             self.parametrize(data))
 
+    def get_plan(self, command):
+        """ Return the compiled plan of the given command.
+
+            Plans of scenario cache steps are compiled once per process,
+            plans of ``compiled`` commands once per block, any other
+            command is compiled again (it may have changed).
+        """
+        plan = self._plans.get(command)
+        if plan is None:
+            plan = scenario_cache.get_plan(command)
+        if plan is None:
+            plan = compile_plan(command)
+        return plan
+
+    def render_command(self, command):
+        """ Return a parametrized copy of the given command """
+        if self.compile_commands:
+            context = self.context
+            return self.get_plan(command).render(
+                context['variables'], context)
+        return self._yaml_loads(
+            yaml_backend.dump(command, default_flow_style=False))
+
     def _merge_payload(self, command):
         """ Merge command with the default command available in
             engine.variables['provider']
@@ -96,56 +216,99 @@ class PlayEngine(object):
         provider = command['provider']
         provider_conf = self.variables.get(provider, {})
         if provider_conf:
-            default = self._yaml_loads(
-                yaml.dump(provider_conf, default_flow_style=False))
-            if provider_conf:
-                return self._merge(default, command)
+            return self._merge(self._render_default(provider, provider_conf),
+                               command)
         return command
 
-    def _merge(self, a, b, path=None):
-        """ merges b and a configurations.
+    def _render_default(self, provider, provider_conf):
+        """ Return a parametrized copy of the provider default command.
+
+            The default command plan is compiled once per provider and
+            compiled again only when ``variables[provider]`` is
+            reassigned.
+        """
+        if not self.compile_commands:
+            return self._yaml_loads(
+                yaml_backend.dump(provider_conf, default_flow_style=False))
+        cached = self._defaults.get(provider)
+        if cached is None or cached[0] is not provider_conf:
+            cached = self._defaults[provider] = (
+                provider_conf, compile_plan(provider_conf))
+        context = self.context
+        return cached[1].render(context['variables'], context)
+
+    def _merge(self, a, b):
+        """ merges b and a configurations (b wins), recursively
+            for dictionaries.
             Based on http://bit.ly/2uFUHgb
          """
-        if path is None:
-            path = []
-
-        for key in b:
+        for key, value in b.items():
             if key in a:
-                if isinstance(a[key], dict) and isinstance(b[key], dict):
-                    self._merge(a[key], b[key], path + [str(key)])
-                elif a[key] == b[key]:
-                    pass  # same leaf value
-                else:
+                current = a[key]
+                if isinstance(current, dict) and isinstance(value, dict):
+                    self._merge(current, value)
+                elif current != value:
                     # b wins
-                    a[key] = b[key]
+                    a[key] = value
             else:
-                a[key] = b[key]
+                a[key] = value
         return a
 
+    def _is_skipped(self, command):
+        """ True if the command skip_condition python expression
+            is true-ish.
+
+            Only the condition is parametrized and evaluated (compiled
+            once), commands without a ``skip_condition`` cost a
+            dictionary lookup.
+        """
+        condition = command.get('skip_condition', None)
+        if condition is None:
+            return False
+        if not isinstance(condition, str):
+            return bool(condition)
+        if has_placeholder(condition):
+            context = self.context
+            condition = substitute(condition, context['variables'], context)
+        return bool(self.evaluate(condition))
+
     def skip_condition(func):
         """ Skip command if skip_condition python expression is falsish  """
         def wrapper(*args, **kwargs):
-            command = args[0]._yaml_loads(
-                yaml.dump(args[1], default_flow_style=False))
-            condition = command.get('skip_condition', None)
-            skip = False
-            if condition is not None:
-                expr = args[0].parametrize(condition)
-                if args[0].execute_command(
-                    {'provider': 'python',
-                     'type': 'exec',
-                     'expression': expr
-                     }):
-                    skip = True
-            if not skip:
+            if not args[0]._is_skipped(args[1]):
                 return func(*args, **kwargs)
         return wrapper
 
+    def prepare(self, data):
+        """ Compile scenario cache steps ahead of execution (e.g., before
+            forking load workers). Plans are stored with the read only
+            scenario cache documents, other commands are ignored.
+        """
+        for step in data:
+            scenario_cache.get_plan(step)
+
+    @contextmanager
+    def compiled(self, commands):
+        """ Compile the given commands once for the duration of the
+            block (e.g., loop sub commands executed on every attempt).
+            Commands must not change meanwhile, their plans are local
+            to this engine and dropped at exit.
+        """
+        for command in commands:
+            self._plans.add(command)
+        try:
+            yield
+        finally:
+            for command in commands:
+                self._plans.discard(command)
+
     def execute_raw(self, data, extra_variables={}):
         """ Execute raw yaml-like file contents """
         if extra_variables:
             self.update_variables(extra_variables)
-        self.execute(list(yaml.safe_load_all(data))[-1])
+        steps = scenario_cache.parse(data).documents[-1]
+        self.prepare(steps)
+        self.execute(steps)
 
     def execute(self, data, extra_variables={}):
         """ Execute parsed yaml-like file contents """
@@ -154,15 +317,9 @@ class PlayEngine(object):
         for step in data:
             self.execute_command(step)
 
-    @skip_condition
-    def execute_command(self, command, **kwargs):
-        """ Execute single command """
-        return_value = None
-        command = self._merge_payload(
-            self._yaml_loads(
-                yaml.dump(
-                    command, default_flow_style=False))
-        )
+    def _prepare_command(self, command):
+        """ Return the parametrized command and its provider method """
+        command = self._merge_payload(self.render_command(command))
         command_type = command['type']
         provider_name = command.get('provider', 'default')
         command_provider = self.get_command_provider(provider_name)
@@ -181,19 +338,49 @@ class PlayEngine(object):
             raise NotImplementedError(
                 'Command not implemented', command_type, provider_name)
         logger.info('Executing command %r', command)
+        return command, method
+
+    def _command_failed(self, command):
+        """ Log a failed command """
+        logger.error('FAILED command %r', command)
+        logger.info('DUMP variables %r', self.variables)
+        print(self.variables)
+
+    def start_timer(self):
+        """ Return a started command timer """
+        return Timer(cpu=self.measure_cpu_time)
+
+    def _command_executed(self, command, timer):
+        """ Track an executed command elapsed time
+            (``_elapsed`` seconds and ``_elapsed_ns`` nanoseconds) """
+        elapsed = timer.elapsed
+        self.timing_sink.record(self, command, elapsed)
+        if self.auto_metrics is not None:
+            self.auto_metrics.record(self, command, elapsed)
+        timings = {'_elapsed': elapsed, '_elapsed_ns': timer.elapsed_ns}
+        if timer.cpu_elapsed_ns is not None:
+            timings['_cpu_elapsed'] = timer.cpu_elapsed
+            timings['_cpu_elapsed_ns'] = timer.cpu_elapsed_ns
+        self.update_variables(timings)
+
+    def _call_command_method(self, method, command, kwargs):
+        """ Invoke a provider command method """
+        return method(command, **kwargs)
+
+    @skip_condition
+    def execute_command(self, command, **kwargs):
+        """ Execute single command """
+        return_value = None
+        command, method = self._prepare_command(command)
 
-        start_time = time.time()
+        timer = self.start_timer()
         try:
-            return_value = method(command, **kwargs)
+            return_value = self._call_command_method(method, command, kwargs)
         except Exception:
-            logger.error('FAILED command %r', command)
-            logger.info('DUMP variables %r', self.variables)
-            print(self.variables)
+            self._command_failed(command)
             raise
         finally:
-            elapsed = time.time() - start_time
-            print(dict(command, _elapsed=elapsed))
-            self.update_variables({'_elapsed': elapsed})
+            self._command_executed(command, timer.stop())
         return return_value
 
     def update_variables(self, extra_variables):
@@ -204,18 +391,32 @@ class PlayEngine(object):
     # register commands
     def register_plugins(self):
         """ Auto register plugins and command providers"""
-        for entrypoint in pkg_resources.iter_entry_points('playcommands'):
-            plugin = entrypoint.load()
-            self.register_command_provider(plugin, entrypoint.name)
+        for name, factory in get_provider_factories().items():
+            self.register_command_provider(factory, name)
 
     def register_command_provider(self, factory, name):
-        """ Register command provider """
-        self.gsm.registerUtility(
-            factory(self),
-            ICommandProvider,
-            name,
-        )
+        """ Register command provider (instantiated on first use) """
+        self._factories[name] = factory
+        self._providers.pop(name, None)
 
     def get_command_provider(self, name):
         """ Get command provider by name """
-        return component.queryUtility(ICommandProvider, name=name)
+        provider = self._providers.get(name)
+        if provider is None:
+            factory = self._factories.get(name)
+            if factory is None:
+                return self.gsm.queryUtility(ICommandProvider, name=name)
+            provider = factory(self)
+            self._providers[name] = provider
+            self.gsm.registerUtility(
+                provider,
+                ICommandProvider,
+                name,
+            )
+            if self.register_globally:
+                component.getGlobalSiteManager().registerUtility(
+                    provider,
+                    ICommandProvider,
+                    name,
+                )
+        return provider
@@ -0,0 +1,33 @@
+# -*- coding: utf-8 -*-
+""" Restricted Python expressions """
+from collections import ChainMap
+from functools import lru_cache
+
+from RestrictedPython import RestrictionCapableEval
+
+
+EXPRESSION_CACHE_SIZE = 1024
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression):
+    """ Return a ready to eval restricted expression.
+
+        Compiled expressions are cached by source (LRU bounded), see
+        ``compile_expression.cache_info()`` for hits and misses.
+    """
+    restricted = RestrictionCapableEval(expression)
+    restricted.prepRestrictedCode()
+    return restricted
+
+
+def make_namespace(builtins, variables, local_vars=None):
+    """ Return a layered evaluation namespace without copying anything:
+
+        * per call locals (e.g., command keyword arguments)
+        * the ``variables`` mapping
+        * read only builtins (never written by the namespace)
+    """
+    if local_vars is None:
+        local_vars = {}
+    return ChainMap(local_vars, {'variables': variables}, builtins)
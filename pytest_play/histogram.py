@@ -0,0 +1,148 @@
+# -*- coding: utf-8 -*-
+""" In-process metrics aggregation.
+
+Recorded metric values are accumulated per metric name in log-bucketed
+histograms (bounded memory, bounded relative error) across all items
+and repeats of a session, so latency percentiles are available at
+session end without shipping every single sample anywhere.
+"""
+import math
+import threading
+
+
+PERCENTILES = (50, 90, 99)
+
+
+class Histogram(object):
+    """ Log-bucketed histogram.
+
+        Values are counted in buckets growing by ``1 + 2 * precision``
+        so reported percentiles have a relative error within about
+        ``precision``. ``min``, ``max`` and ``total`` are exact.
+    """
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self._log_base = math.log(1 + 2 * precision)
+        self.buckets = {}
+        self.count = 0
+        self.total = 0.
+        self.min = None
+        self.max = None
+
+    def _bucket(self, value):
+        if value == 0:
+            return (0, 0)
+        index = int(math.floor(math.log(abs(value)) / self._log_base))
+        if value > 0:
+            return (1, index)
+        return (-1, -index)
+
+    def _bucket_value(self, bucket):
+        sign, index = bucket
+        if sign < 0:
+            index = -index
+        value = sign * math.exp((index + 0.5) * self._log_base)
+        return min(max(value, self.min), self.max)
+
+    def record(self, value):
+        """ Record a value """
+        bucket = self._bucket(value)
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        """ Nearest-rank percentile (approximated by bucket) """
+        if not self.count:
+            return None
+        rank = max(int(math.ceil(percent / 100. * self.count)), 1)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return self._bucket_value(bucket)
+
+    def export(self):
+        """ Picklable histogram data (e.g., sent by worker processes) """
+        return {
+            'buckets': dict(self.buckets),
+            'count': self.count,
+            'total': self.total,
+            'min': self.min,
+            'max': self.max,
+        }
+
+    def merge(self, data):
+        """ Merge exported histogram data """
+        if not data['count']:
+            return
+        for bucket, count in data['buckets'].items():
+            self.buckets[bucket] = self.buckets.get(bucket, 0) + count
+        self.count += data['count']
+        self.total += data['total']
+        if self.min is None or data['min'] < self.min:
+            self.min = data['min']
+        if self.max is None or data['max'] > self.max:
+            self.max = data['max']
+
+    def summary(self):
+        """ Return count, mean, min, max and p50/p90/p99 """
+        data = {
+            'count': self.count,
+            'mean': self.total / self.count if self.count else None,
+            'min': self.min,
+            'max': self.max,
+        }
+        for percent in PERCENTILES:
+            data['p{0}'.format(percent)] = self.percentile(percent)
+        return data
+
+
+class Histograms(object):
+    """ Histograms by metric name """
+
+    def __init__(self, precision=0.01):
+        self.precision = precision
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, value):
+        """ Record a value for the given metric name """
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram(
+                    self.precision)
+            histogram.record(value)
+
+    def export(self):
+        """ Picklable histograms data by metric name """
+        with self._lock:
+            return dict(
+                (name, histogram.export())
+                for name, histogram in self.histograms.items())
+
+    def merge(self, data):
+        """ Merge exported histograms data """
+        with self._lock:
+            for name, histogram_data in data.items():
+                histogram = self.histograms.get(name)
+                if histogram is None:
+                    histogram = self.histograms[name] = Histogram(
+                        self.precision)
+                histogram.merge(histogram_data)
+
+    def summary(self):
+        """ Return per metric summaries sorted by name """
+        with self._lock:
+            return [
+                dict(self.histograms[name].summary(), name=name)
+                for name in sorted(self.histograms)]
+
+    def __len__(self):
+        return len(self.histograms)
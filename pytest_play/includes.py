@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+""" Static include graph.
+
+``include`` commands with literal paths (no ``$var`` or ``{! !}``
+placeholders) are followed ahead of execution so missing files and
+recursive includes (``A`` includes ``B`` includes ``A``) are reported
+at collection time. Visited scenarios are parsed through the scenario
+cache, so they are ready when executed.
+"""
+import os
+
+from .plan import has_placeholder
+from .scenarios import scenario_cache
+
+
+def include_path(path):
+    """ Return the absolute path of an included scenario """
+    return os.path.abspath(os.path.normcase(path))
+
+
+def iter_includes(data):
+    """ Yield literal include paths found in parsed commands
+        (nested commands too, e.g. loops sub commands) """
+    if isinstance(data, dict):
+        if data.get('provider') == 'include' and \
+                data.get('type') == 'include':
+            path = data.get('path')
+            if isinstance(path, str) and not has_placeholder(path):
+                yield include_path(path)
+        for value in data.values():
+            for path in iter_includes(value):
+                yield path
+    elif isinstance(data, list):
+        for item in data:
+            for path in iter_includes(item):
+                yield path
+
+
+class IncludeGraph(object):
+    """ Include graph of scenarios, checked once per file """
+
+    def __init__(self, cache=scenario_cache):
+        self.cache = cache
+        self.edges = {}
+        self._checked = set()
+
+    def includes(self, path):
+        """ Return the literal includes of the given scenario """
+        includes = self.edges.get(path)
+        if includes is None:
+            documents = self.cache.get(path).documents
+            includes = self.edges[path] = list(dict.fromkeys(
+                iter_includes(documents[-1] if documents else [])))
+        return includes
+
+    def check(self, path):
+        """ Raise ValueError if the given scenario includes (directly
+            or not) missing files or itself """
+        self._check(include_path(str(path)), [])
+
+    def _check(self, path, stack):
+        if path in self._checked:
+            return
+        if path in stack:
+            cycle = stack[stack.index(path):] + [path]
+            raise ValueError('Include cycle', ' -> '.join(cycle))
+        stack.append(path)
+        for included in self.includes(path):
+            if not os.path.isfile(included):
+                raise ValueError(
+                    'Included file not found', included, 'included by', path)
+            self._check(included, stack)
+        stack.pop()
+        self._checked.add(path)
@@ -0,0 +1,287 @@
+# -*- coding: utf-8 -*-
+""" Built-in load generation for YAML scenarios.
+
+Collected YAML items are executed repeatedly by a number of concurrent
+virtual users (threads) reusing the already parsed scenarios and the
+same pytest session, tracking per command throughput and latency
+percentiles.
+
+Users may be spread across forked worker processes (e.g., for CPU bound
+scenarios): scenarios are parsed and compiled before forking so workers
+start warm and send their stats back to the parent over a pipe.
+"""
+import logging
+import multiprocessing
+import threading
+import time
+from collections import namedtuple
+
+from .histogram import Histograms
+from .scenarios import scenario_cache
+from .stats import close_statsd_client
+from .timing import Timer
+
+
+logger = logging.getLogger(__name__)
+
+
+LoadSpec = namedtuple(
+    'LoadSpec', ['users', 'duration', 'ramp', 'iterations', 'processes'])
+
+DURATION_UNITS = (
+    ('ms', 0.001),
+    ('s', 1),
+    ('m', 60),
+    ('h', 3600),
+)
+
+
+def parse_duration(value):
+    """ Return seconds for a duration like ``500ms``, ``60s``, ``1m`` """
+    value = value.strip()
+    for suffix, factor in DURATION_UNITS:
+        if value.endswith(suffix):
+            return float(value[:-len(suffix)]) * factor
+    return float(value)
+
+
+def parse_load_spec(spec):
+    """ Parse a ``users=N,duration=60s,ramp=10s,iterations=M,processes=P``
+        load specification.
+
+        Without ``duration`` and ``iterations`` each user executes
+        one iteration.
+    """
+    options = {'users': 1, 'duration': None, 'ramp': 0., 'iterations': None,
+               'processes': 1}
+    for token in spec.split(','):
+        name, sep, value = token.partition('=')
+        name = name.strip()
+        if not sep or name not in options:
+            raise ValueError('Invalid load option', token)
+        if name in ('users', 'iterations', 'processes'):
+            options[name] = int(value)
+        else:
+            options[name] = parse_duration(value)
+    if options['duration'] is None and options['iterations'] is None:
+        options['iterations'] = 1
+    if options['users'] < 1:
+        raise ValueError('At least one user is needed', spec)
+    if options['processes'] < 1:
+        raise ValueError('At least one process is needed', spec)
+    if options['processes'] > 1 and \
+            'fork' not in multiprocessing.get_all_start_methods():
+        raise ValueError(
+            'Worker processes need fork support (not available on this '
+            'platform)', spec)
+    return LoadSpec(**options)
+
+
+class LoadStats(object):
+    """ Per command latency histograms (bounded memory, whatever
+        the load duration) """
+
+    def __init__(self):
+        self.histograms = Histograms()
+        self.errors = {}
+        self.iterations = 0
+        self.start_time = None
+        self.end_time = None
+        self._lock = threading.Lock()
+
+    def record(self, name, elapsed, error=False):
+        """ Record a command execution """
+        self.histograms.record(name, elapsed)
+        if error:
+            with self._lock:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    def record_iteration(self):
+        """ Record a completed user iteration """
+        with self._lock:
+            self.iterations += 1
+
+    def export(self):
+        """ Picklable stats (e.g., sent by worker processes) """
+        with self._lock:
+            return {
+                'histograms': self.histograms.export(),
+                'errors': self.errors,
+                'iterations': self.iterations,
+            }
+
+    def merge(self, data):
+        """ Merge exported stats """
+        self.histograms.merge(data['histograms'])
+        with self._lock:
+            for name, errors in data['errors'].items():
+                self.errors[name] = self.errors.get(name, 0) + errors
+            self.iterations += data['iterations']
+
+    @property
+    def elapsed(self):
+        end_time = self.end_time
+        if end_time is None:
+            end_time = time.monotonic()
+        return end_time - self.start_time
+
+    @property
+    def total_errors(self):
+        return sum(self.errors.values())
+
+    def summary(self):
+        """ Return per command stats (count, errors, throughput and
+            p50/p90/p99/max latencies in seconds) """
+        rows = []
+        elapsed = self.elapsed
+        for row in self.histograms.summary():
+            rows.append({
+                'name': row['name'],
+                'count': row['count'],
+                'errors': self.errors.get(row['name'], 0),
+                'throughput': elapsed and row['count'] / elapsed or 0.,
+                'p50': row['p50'],
+                'p90': row['p90'],
+                'p99': row['p99'],
+                'max': row['max'],
+            })
+        return rows
+
+
+class LoadRunner(object):
+    """ Execute YAML items concurrently and repeatedly.
+
+        Every scenario execution runs on a fresh engine forked from the
+        given (already set up) ``play`` engine.
+    """
+
+    def __init__(self, spec, play, items):
+        self.spec = spec
+        self.play = play
+        self.items = items
+        self.variables = dict(play.variables)
+        self.stats = LoadStats()
+
+    def run(self):
+        """ Run the load and return stats """
+        self.stats.start_time = time.monotonic()
+        end_time = None
+        if self.spec.duration is not None:
+            end_time = self.stats.start_time + self.spec.duration
+        users = range(self.spec.users)
+        if self.spec.processes > 1:
+            self._run_processes(users, end_time)
+        else:
+            self._run_users(users, end_time)
+        self.stats.end_time = time.monotonic()
+        return self.stats
+
+    def warm_up(self):
+        """ Parse and compile scenarios ahead of execution """
+        for item in self.items:
+            self.play.prepare(scenario_cache.get(item.path).documents[-1])
+
+    def _run_users(self, indexes, end_time):
+        users = [
+            threading.Thread(
+                target=self._user, args=(index, end_time),
+                name='play-load-{0}'.format(index))
+            for index in indexes]
+        for user in users:
+            user.start()
+        for user in users:
+            user.join()
+
+    def _run_processes(self, users, end_time):
+        self.warm_up()
+        context = multiprocessing.get_context('fork')
+        workers = []
+        for process_index in range(self.spec.processes):
+            indexes = users[process_index::self.spec.processes]
+            if not indexes:
+                continue
+            reader, writer = context.Pipe(duplex=False)
+            process = context.Process(
+                target=self._worker, args=(indexes, end_time, writer),
+                name='play-load-worker-{0}'.format(process_index))
+            process.start()
+            writer.close()
+            workers.append((process, reader))
+        for process, reader in workers:
+            try:
+                data = reader.recv()
+            except EOFError:
+                logger.error('Load worker %s died', process.name)
+                self.stats.record(process.name, 0., error=True)
+            else:
+                self.stats.merge(data['stats'])
+                if data['histograms']:
+                    self.play.request.config._play_histograms.merge(
+                        data['histograms'])
+            process.join()
+
+    def _worker(self, indexes, end_time, writer):
+        self.stats = LoadStats()
+        config = self.play.request.config
+        histograms = getattr(config, '_play_histograms', None)
+        if histograms is not None:
+            # metrics recorded by this worker only
+            histograms = config._play_histograms = Histograms(
+                histograms.precision)
+        # the parent statsd client buffer and flusher thread are not
+        # usable after fork: workers send metrics on a client of their own
+        config._play_statsd_client = None
+        try:
+            self._run_users(indexes, end_time)
+        finally:
+            # worker processes exit without pytest_unconfigure
+            close_statsd_client(config)
+        writer.send({
+            'stats': self.stats.export(),
+            'histograms': histograms.export() if histograms else None,
+        })
+        writer.close()
+
+    def _user(self, index, end_time):
+        delay = self.spec.ramp * index / self.spec.users
+        if delay:
+            time.sleep(delay)
+        iteration = 0
+        while self.spec.iterations is None or \
+                iteration < self.spec.iterations:
+            for item in self.items:
+                if end_time is not None and time.monotonic() >= end_time:
+                    return
+                self.run_item(item)
+            self.stats.record_iteration()
+            iteration += 1
+
+    def run_item(self, item):
+        """ Execute a YAML item scenario once """
+        documents = scenario_cache.get(item.path).documents
+        engine = self.play.fork(dict(self.variables), share_teardown=False)
+        engine.update_variables(item.test_data)
+        engine.prepare(documents[-1])
+        try:
+            for index, step in enumerate(documents[-1]):
+                name = command_name(item, index, step)
+                timer = Timer()
+                try:
+                    engine.execute_command(step)
+                except Exception:
+                    logger.exception('FAILED load command %s', name)
+                    self.stats.record(
+                        name, timer.stop().elapsed, error=True)
+                    return
+                self.stats.record(name, timer.stop().elapsed)
+        finally:
+            engine.teardown()
+
+
+def command_name(item, index, command):
+    """ Stats name for a scenario command """
+    return '{0} #{1} {2}.{3}'.format(
+        item.parent.nodeid,
+        index,
+        command.get('provider', 'default'),
+        command.get('type'))
@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+""" Compiled command plans.
+
+A command is analysed once into a template tree where static leaves
+are kept as they are and only the leaves containing ``$var`` or
+``{! expr !}`` placeholders are substituted at execution time.
+
+The rendered result is equivalent to the legacy
+``yaml.dump`` + parametrize + ``yaml.safe_load`` round-trip
+without paying for YAML serialization on every step.
+"""
+import threading
+from functools import lru_cache
+from string import Template
+
+import yaml
+from jinja2 import Template as Jinja2Template
+
+from .yaml_backend import yaml_backend
+
+
+PLACEHOLDER_MARKERS = ('$', '{!', '{%', '{#')
+JINJA_MARKERS = ('{!', '{%', '{#')
+
+STR_TAG = 'tag:yaml.org,2002:str'
+QUOTED_STYLES = ("'", '"', '|', '>')
+FLOW_COLLECTIONS = ('[]', '{}')
+
+_resolver = yaml.resolver.Resolver()
+
+
+def has_placeholder(value):
+    """ Return True if the given string needs substitution """
+    return any(marker in value for marker in PLACEHOLDER_MARKERS)
+
+
+@lru_cache(maxsize=1024)
+def _jinja_template(source):
+    """ Compiled ``{! expr !}`` template (cached by source) """
+    return Jinja2Template(
+        source,
+        variable_start_string='{!',
+        variable_end_string='!}',
+        keep_trailing_newline=True)
+
+
+def substitute(value, variables, context):
+    """ Parametrize a single string value like ``Parametrizer`` does """
+    value = Template(value).safe_substitute(variables)
+    if any(marker in value for marker in JINJA_MARKERS):
+        value = _jinja_template(value).render(**context)
+    return value
+
+
+@lru_cache(maxsize=1024)
+def _is_plain(value):
+    """ True if ``yaml.dump`` would emit the string as a plain scalar,
+        so a substituted value gets re-typed as the round-trip does
+    """
+    return not yaml_backend.dump(value).startswith(QUOTED_STYLES)
+
+
+def resolve_scalar(value):
+    """ Re-type a substituted plain scalar the way a YAML loader would
+        (e.g., ``'0.5'`` -> ``0.5``, ``'[1, 2]'`` -> ``[1, 2]``).
+
+        Only values resolving to a non string scalar tag (int, float,
+        bool, null, timestamp) and whole flow collections are loaded:
+        anything else (e.g., ``'foo: bar'``) stays a string.
+    """
+    tag = _resolver.resolve(yaml.ScalarNode, value, (True, False))
+    if tag != STR_TAG or value[:1] + value[-1:] in FLOW_COLLECTIONS:
+        return yaml_backend.load(value)
+    return value
+
+
+class StaticNode(object):
+    """ A leaf without placeholders """
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def render(self, variables, context):
+        return self.value
+
+
+class PlaceholderNode(object):
+    """ A string leaf containing placeholders """
+
+    __slots__ = ('source', 'plain')
+
+    def __init__(self, source):
+        self.source = source
+        self.plain = _is_plain(source)
+
+    def render(self, variables, context):
+        value = substitute(self.source, variables, context)
+        if self.plain:
+            return resolve_scalar(value)
+        return value
+
+
+class MappingNode(object):
+    """ A mapping: rendered as a fresh dictionary """
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, variables, context):
+        return {
+            key.render(variables, context): value.render(variables, context)
+            for key, value in self.items}
+
+
+class SequenceNode(object):
+    """ A sequence: rendered as a fresh list """
+
+    __slots__ = ('items',)
+
+    def __init__(self, items):
+        self.items = items
+
+    def render(self, variables, context):
+        return [item.render(variables, context) for item in self.items]
+
+
+def compile_plan(data):
+    """ Compile parsed YAML data into a template tree """
+    if isinstance(data, dict):
+        return MappingNode([
+            (compile_plan(key), compile_plan(value))
+            for key, value in data.items()])
+    if isinstance(data, list):
+        return SequenceNode([compile_plan(item) for item in data])
+    if isinstance(data, str) and has_placeholder(data):
+        return PlaceholderNode(data)
+    return StaticNode(data)
+
+
+class PlanCache(object):
+    """ Compiled plans of read only commands keyed by identity
+        (e.g., the steps of a parsed scenario document).
+
+        The command object is kept alongside its plan so its ``id``
+        cannot be reused by another object while cached.
+    """
+
+    def __init__(self):
+        self._plans = {}
+        self._lock = threading.Lock()
+
+    def add(self, command):
+        """ Compile (once) and cache the plan of a read only command """
+        plan = self.get(command)
+        if plan is None:
+            with self._lock:
+                plan = self.get(command)
+                if plan is None:
+                    plan = compile_plan(command)
+                    self._plans[id(command)] = (command, plan)
+        return plan
+
+    def get(self, command):
+        """ Return the cached plan of the given command, if any """
+        cached = self._plans.get(id(command))
+        if cached is not None and cached[0] is command:
+            return cached[1]
+        return None
+
+    def discard(self, command):
+        """ Forget the plan of the given command """
+        with self._lock:
+            if self.get(command) is not None:
+                del self._plans[id(command)]
+
+    def clear(self):
+        with self._lock:
+            self._plans.clear()
+
+    def __len__(self):
+        return len(self._plans)
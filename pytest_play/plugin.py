@@ -1,6 +1,5 @@
 # -*- coding: utf-8 -*-
 import uuid            # pragma: no cover
-import yaml            # pragma: no cover
 import os              # pragma: no cover
 import re              # pragma: no cover
 import pytest          # pragma: no cover
@@ -17,6 +16,23 @@ from pytest_play.config import (  # pragma: no cover
     STATSD,
     PYTEST_STATSD,
 )
+from pytest_play.scenarios import (  # pragma: no cover
+    CollectionCache,
+    scenario_cache,
+)
+from pytest_play.yaml_backend import yaml_backend  # pragma: no cover
+from pytest_play.load import (  # pragma: no cover
+    LoadRunner,
+    parse_load_spec,
+)
+from pytest_play.histogram import Histograms  # pragma: no cover
+from pytest_play.includes import IncludeGraph  # pragma: no cover
+from pytest_play.stats import close_statsd_client  # pragma: no cover
+from pytest_play.timing import (  # pragma: no cover
+    make_auto_metrics,
+    make_sink,
+    set_timing_sink,
+)
 
 
 def pytest_addoption(parser):
@@ -24,6 +40,50 @@ def pytest_addoption(parser):
     :param parser:
     :return:
     """
+    group = parser.getgroup('pytest-play')
+    group.addoption(
+        '--play-yaml-backend', action='store', dest='play_yaml_backend',
+        default='auto', choices=('auto', 'libyaml', 'python'),
+        help='YAML parser/emitter implementation. Default is \'auto\' '
+             '(libyaml if available)')
+    group.addoption(
+        '--play-load', action='store', dest='play_load',
+        metavar='users=N,duration=60s,ramp=10s', default=None,
+        help='run collected YAML scenarios repeatedly with N concurrent '
+             'users for the given duration (or iterations=M per user) '
+             'reporting per command throughput and latency percentiles')
+    group.addoption(
+        '--play-timing-sink', action='store', dest='play_timing_sink',
+        metavar='sink', default=None,
+        help='where executed commands timings go: print (default, none '
+             'with --play-load), none, ring[:size] (in memory) or '
+             'jsonl:path (JSON lines file)')
+    group.addoption(
+        '--play-cpu-time', action='store_true', dest='play_cpu_time',
+        default=False,
+        help='measure commands CPU time too (_cpu_elapsed variable)')
+    group.addoption(
+        '--play-auto-metrics', action='store', dest='play_auto_metrics',
+        metavar='patterns', default=None,
+        help='record the elapsed time of every command matching one of '
+             'the given comma separated provider.type or comment patterns '
+             '(e.g., \'*\', \'play_requests.*\') as timing metrics')
+    group.addoption(
+        '--play-auto-metrics-name', action='store',
+        dest='play_auto_metrics_name', metavar='template', default=None,
+        help='auto metrics name template using command fields and test. '
+             'Default is \'{provider}.{type}\'')
+    group.addoption(
+        '--play-check-includes', action='store_true',
+        dest='play_check_includes', default=False,
+        help='follow include commands with literal paths at collection '
+             'time reporting missing files and include cycles')
+    group.addoption(
+        '--play-histograms', action='store_true', dest='play_histograms',
+        default=False,
+        help='aggregate recorded metrics in histograms reporting '
+             'p50/p90/p99/max at session end (terminal summary and '
+             'JUnit XML testsuite properties)')
 
     if STATSD is True:
         if not PYTEST_STATSD:
@@ -43,6 +103,189 @@ def pytest_addoption(parser):
                 '--stats-prefix', action='store', dest='stats_prefix',
                 metavar='prefix', default=None,
                 help='prefix to give all stats')
+        group = parser.getgroup('pytest-play')
+        group.addoption(
+            '--stats-batch-size', action='store', dest='stats_batch_size',
+            metavar='size', type=int, default=0,
+            help='send statsd metrics in batches of the given size '
+                 '(flushed at session end too). Default is 0 (no batching)')
+        group.addoption(
+            '--stats-flush-interval', action='store',
+            dest='stats_flush_interval', metavar='seconds', type=float,
+            default=None,
+            help='send batched statsd metrics at least every given seconds')
+
+
+def pytest_configure(config):
+    try:
+        yaml_backend.use(config.getoption('play_yaml_backend'))
+    except ValueError:
+        raise pytest.UsageError(
+            'libyaml is not available, PyYAML was built without it')
+    cache = getattr(config, 'cache', None)
+    if cache is not None:
+        config._play_collection_cache = CollectionCache(cache)
+    sink_spec = config.getoption('play_timing_sink')
+    if sink_spec is None:
+        # load runs don't print every command of every iteration
+        sink_spec = 'none' if config.getoption('play_load') else 'print'
+    try:
+        sink = make_sink(sink_spec)
+    except (ValueError, OSError) as e:
+        raise pytest.UsageError(
+            'Invalid --play-timing-sink option: {0}'.format(e))
+    config._play_timing_sink = sink
+    config._play_previous_timing_sink = set_timing_sink(sink)
+    config._play_auto_metrics = None
+    if config.getoption('play_auto_metrics'):
+        try:
+            config._play_auto_metrics = make_auto_metrics(
+                config.getoption('play_auto_metrics'),
+                name=config.getoption('play_auto_metrics_name'))
+        except ValueError as e:
+            raise pytest.UsageError(
+                'Invalid --play-auto-metrics option: {0}'.format(e))
+    config._play_include_graph = None
+    if config.getoption('play_check_includes'):
+        config._play_include_graph = IncludeGraph()
+    config._play_histograms = None
+    if config.getoption('play_histograms'):
+        config._play_histograms = Histograms()
+    config._play_load = None
+    if config.getoption('play_load'):
+        try:
+            config._play_load = parse_load_spec(
+                config.getoption('play_load'))
+        except ValueError as e:
+            raise pytest.UsageError(
+                'Invalid --play-load option: {0}'.format(e))
+
+
+def pytest_unconfigure(config):
+    close_statsd_client(config)
+    sink = getattr(config, '_play_timing_sink', None)
+    if sink is not None:
+        sink.close()
+        set_timing_sink(config._play_previous_timing_sink)
+
+
+def pytest_report_header(config):
+    return 'pytest-play: yaml backend {0}'.format(yaml_backend.name)
+
+
+def pytest_collection_finish(session):
+    collection_cache = getattr(
+        session.config, '_play_collection_cache', None)
+    if collection_cache is not None:
+        collection_cache.save()
+
+
+def _setup_item(session, item):
+    setupstate = session._setupstate
+    prepare = getattr(setupstate, 'prepare', None) or setupstate.setup
+    prepare(item)
+
+
+def _is_load_skipped(item):
+    """ True if skip/skipif/xfail markers apply to the given item
+        (same evaluation as a regular ``pytest_runtest_setup``) """
+    from _pytest import skipping
+    try:
+        skipping.pytest_runtest_setup(item)
+    except (pytest.skip.Exception, pytest.xfail.Exception):
+        return True
+    if item.config.option.runxfail:
+        return False
+    evaluate_xfail_marks = getattr(skipping, 'evaluate_xfail_marks', None)
+    if evaluate_xfail_marks is not None:
+        return evaluate_xfail_marks(item) is not None
+    evalxfail = getattr(item, '_evalxfail', None)
+    return evalxfail is not None and evalxfail.istrue()
+
+
+def _teardown_all(session):
+    setupstate = session._setupstate
+    if hasattr(setupstate, 'teardown_all'):
+        setupstate.teardown_all()
+    else:
+        setupstate.teardown_exact(None)
+
+
+def pytest_runtestloop(session):
+    spec = getattr(session.config, '_play_load', None)
+    if spec is None or session.config.option.collectonly:
+        return None
+    items = [item for item in session.items
+             if isinstance(item, YAMLItem) and not _is_load_skipped(item)]
+    if items:
+        try:
+            _setup_item(session, items[0])
+            runner = LoadRunner(spec, items[0].play, items)
+            session.config._play_load_stats = runner.run()
+        finally:
+            _teardown_all(session)
+        session.testsfailed += runner.stats.total_errors
+    return True
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_sessionfinish(session):
+    histograms = getattr(session.config, '_play_histograms', None)
+    xml = getattr(session.config, '_xml', None)
+    if histograms and xml is not None:
+        for row in histograms.summary():
+            for key in ('count', 'p50', 'p90', 'p99', 'max'):
+                xml.add_global_property(
+                    '{0}.{1}'.format(row['name'], key), row[key])
+
+
+def pytest_terminal_summary(terminalreporter):
+    histograms = getattr(terminalreporter.config, '_play_histograms', None)
+    if histograms:
+        _metrics_summary(terminalreporter, histograms)
+    stats = getattr(terminalreporter.config, '_play_load_stats', None)
+    if stats is not None:
+        _load_summary(terminalreporter, stats)
+
+
+def _metrics_summary(terminalreporter, histograms):
+    terminalreporter.write_sep('=', 'pytest-play metrics')
+    terminalreporter.write_line(
+        '{0:<50} {1:>8} {2:>12} {3:>12} {4:>12} {5:>12}'.format(
+            'metric', 'count', 'p50', 'p90', 'p99', 'max'))
+    for row in histograms.summary():
+        terminalreporter.write_line(
+            '{name:<50} {count:>8} {p50:>12.4g} {p90:>12.4g} '
+            '{p99:>12.4g} {max:>12.4g}'.format(**row))
+
+
+def _load_summary(terminalreporter, stats):
+    spec = terminalreporter.config._play_load
+    terminalreporter.write_sep('=', 'pytest-play load')
+    terminalreporter.write_line(
+        'users: {0}, iterations: {1}, elapsed: {2:.2f}s, '
+        'errors: {3}'.format(
+            spec.users, stats.iterations, stats.elapsed, stats.total_errors))
+    terminalreporter.write_line(
+        '{0:<50} {1:>8} {2:>7} {3:>9} {4:>9} {5:>9} {6:>9} {7:>9}'.format(
+            'command', 'count', 'errors', 'req/s',
+            'p50 ms', 'p90 ms', 'p99 ms', 'max ms'))
+    for row in stats.summary():
+        terminalreporter.write_line(
+            '{name:<50} {count:>8} {errors:>7} {throughput:>9.2f} '
+            '{p50:>9.2f} {p90:>9.2f} {p99:>9.2f} {max:>9.2f}'.format(
+                **dict(row, **dict(
+                    (key, row[key] * 1000)
+                    for key in ('p50', 'p90', 'p99', 'max')))))
+
+
+def get_metadata(config, path):
+    """ Return scenario metadata using the persistent collection cache
+        if available """
+    collection_cache = getattr(config, '_play_collection_cache', None)
+    if collection_cache is not None:
+        return collection_cache.get_metadata(path)
+    return scenario_cache.get_metadata(path)
 
 
 def get_marker(node, name):
@@ -75,14 +318,11 @@ class YAMLFile(pytest.File):
         values = []
         test_data = []
         markers = []
-        metadata = None
-
-        with open(self.fspath, 'r') as yaml_file:
-            documents = list(yaml.safe_load_all(yaml_file))
-            len_documents = len(documents)
-            assert len_documents <= 2
-            if len_documents > 1:
-                metadata = documents[0]
+
+        include_graph = getattr(self.config, '_play_include_graph', None)
+        if include_graph is not None:
+            include_graph.check(self.fspath)
+        metadata = get_metadata(self.config, self.fspath)
         if metadata:
             # a pytest-play metadata exists for the given item
             markers = [marker for marker in metadata.get(
@@ -193,12 +433,13 @@ class YAMLItem(pytest.Item):
         self.play = self._request.getfixturevalue('play')
 
     def _setup_raw_data(self):
-        self.raw_data = self.play and self.play.get_file_contents(
-            self.path)
+        self.raw_data = self.play and scenario_cache.get(self.path).text
 
     def runtest(self):
-        data = self.play.get_file_contents(self.path)
-        self.play.execute_raw(data, extra_variables=self.test_data)
+        documents = scenario_cache.get(self.path).documents
+        assert len(documents) <= 2
+        self.play.prepare(documents[-1])
+        self.play.execute(documents[-1], extra_variables=self.test_data)
 
 
 @pytest.fixture
@@ -244,5 +485,8 @@ def play(request, play_engine_class, variables):
                 context[username_key] = credential_settings['username']
                 context[password_key] = credential_settings['password']
     play = play_engine_class(request, context)
+    if request.config.getoption('play_cpu_time', False):
+        play.measure_cpu_time = True
+    play.auto_metrics = getattr(request.config, '_play_auto_metrics', None)
     yield play
     play.teardown()
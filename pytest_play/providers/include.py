@@ -1,12 +1,25 @@
-import os
 from . import BaseProvider
+from ..includes import include_path
 
 
 class IncludeProvider(BaseProvider):
     """ PlayEngine wrapper """
 
+    def __init__(self, engine):
+        super(IncludeProvider, self).__init__(engine)
+        self._paths = {}
+
+    def get_path(self, path):
+        """ Return the absolute path of an included scenario
+            (relative paths are resolved once) """
+        resolved = self._paths.get(path)
+        if resolved is None:
+            resolved = self._paths[path] = include_path(path)
+        return resolved
+
     def command_include(self, command, **kwargs):
-        """ Include scenario """
-        file_path = os.path.normcase(command['path'])
-        data = self.engine.get_file_contents(file_path)
-        self.engine.execute_raw(data)
+        """ Include scenario (parsed once, shared with the scenario
+            cache) """
+        scenario = self.engine.get_scenario(self.get_path(command['path']))
+        self.engine.prepare(scenario.documents[-1])
+        self.engine.execute(scenario.documents[-1])
@@ -1,23 +1,30 @@
-import time
+import numbers
 
 from ..config import STATSD
+from ..stats import get_statsd_client
+from ..timing import perf_counter_ns
 from . import BaseProvider
 
 
+def _discard_property(name, value):
+    pass
+
+
 class MetricsProvider(BaseProvider):
     """ PlayEngine wrapper """
     def __init__(self, *args, **kwargs):
         super(MetricsProvider, self).__init__(*args, **kwargs)
-        self._record_property = self.engine.request.getfixturevalue(
-            'record_property')
+        if getattr(self.engine.request.config, '_play_load', None):
+            # load runs don't accumulate JUnit XML properties
+            self._record_property = _discard_property
+        else:
+            self._record_property = self.engine.request.getfixturevalue(
+                'record_property')
 
     @property
     def statsd_client(self):
-        import statsd
-        host = self.engine.request.config.getoption('stats_host')
-        port = self.engine.request.config.getoption('stats_port')
-        prefix = self.engine.request.config.getoption('stats_prefix')
-        return statsd.StatsClient(host, port, prefix=prefix)
+        """ The session statsd client """
+        return get_statsd_client(self.engine.request.config)
 
     def _record_property_statsd(
             self, name, value, metric_type=None, meas_unit=None):
@@ -38,10 +45,23 @@ class MetricsProvider(BaseProvider):
                 if method is not None:
                     method(name, value)
 
+    @property
+    def histograms(self):
+        """ Session metrics histograms (``--play-histograms``) """
+        return getattr(self.engine.request.config, '_play_histograms', None)
+
+    def _record_property_histogram(self, name, value):
+        histograms = self.histograms
+        if histograms is not None and \
+                isinstance(value, numbers.Real) and \
+                not isinstance(value, bool):
+            histograms.record(name, value)
+
     def record_property(self, name, value, metric_type=None, meas_unit=None):
         """ Record a property metrics """
         self._record_property_statsd(
             name, value, metric_type=metric_type, meas_unit=meas_unit)
+        self._record_property_histogram(name, value)
         self._record_property(name, value)
 
     def command_record_property(self, command, **kwargs):
@@ -49,10 +69,7 @@ class MetricsProvider(BaseProvider):
         name = command['name']
         expression = command['expression']
         metric_type = command.get('metric_type', None)
-        value = self.engine.execute_command(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': expression})
+        value = self.engine.evaluate(expression)
         self.record_property(name, value, metric_type=metric_type)
         self.engine.update_variables({name: value})
 
@@ -65,14 +82,16 @@ class MetricsProvider(BaseProvider):
                              meas_unit='s')
 
     def command_record_elapsed_start(self, command, **kwargs):
-        """ record a time delta (start tracking time) """
+        """ record a time delta (start tracking time, monotonic
+            nanoseconds) """
         name = command['name']
-        self.engine.update_variables({name: time.time()})
+        self.engine.update_variables({name: perf_counter_ns()})
 
     def command_record_elapsed_stop(self, command, **kwargs):
         """ record a time delta (end tracking time) """
         name = command['name']
-        delta = time.time() - self.engine.variables[name]
-        self.engine.update_variables({name: delta})
+        delta_ns = perf_counter_ns() - self.engine.variables[name]
+        delta = delta_ns / 1e9
+        self.engine.update_variables({name: delta, name + '_ns': delta_ns})
         self.record_property(name, delta, metric_type='timing',
                              meas_unit='s')
@@ -1,15 +1,18 @@
 import logging
-from time import (
-    sleep,
-    time,
-)
-from RestrictedPython import RestrictionCapableEval
+from concurrent.futures import ThreadPoolExecutor
+from time import sleep
+from pytest_play.expressions import compile_expression
 from pytest_play.providers import BaseProvider
+from pytest_play.timing import Timer
+from pytest_play.waits import Waiter
 
 
 logger = logging.getLogger(__name__)
 
 
+PARALLEL_MAX_WORKERS = 10
+
+
 class TimeoutException(Exception):
     """ Timeout exception """
 
@@ -18,9 +21,7 @@ class PythonProvider(BaseProvider):
     """ Python command provider """
 
     def _get_context(self, extra_context):
-        context = self.engine.context
-        context.update(extra_context)
-        return context
+        return self.engine.namespace(**extra_context)
 
     def command_assert(self, command, **kwargs):
         """ Make an assertion based on a command containing
@@ -69,81 +70,125 @@ class PythonProvider(BaseProvider):
         wait_time = float(command['seconds'])
         sleep(wait_time)
 
-    def command_while(self, command, **kwargs):
-        """ While expression is true-ish
+    def _get_waiter(self, command):
+        """ Return a waiter for polling commands (``timeout``, ``poll``,
+            ``backoff``, ``max_poll`` and ``jitter`` options) """
+        return Waiter(
+            self.engine.wake_signal,
+            timeout=command.get('timeout', 10),
+            poll=command.get('poll', 0.1),
+            backoff=command.get('backoff', 1),
+            max_poll=command.get('max_poll', None),
+            jitter=command.get('jitter', 0))
+
+    def _loop(self, command, kwargs, stop_value, sub_commands_first):
+        """ Polling loop shared by ``while``, ``wait_until`` and
+            ``wait_until_not``: stops when the condition evaluates to
+            ``stop_value``.
+
+            The condition (evaluated with ``engine.evaluate``) and the
+            sub commands are compiled once. The number of attempts, the
+            total time spent waiting between attempts and the last and
+            max attempt elapsed times are exposed as ``_loop_iterations``,
+            ``_loop_waited``, ``_loop_last_elapsed`` and
+            ``_loop_max_elapsed`` variables.
         """
-        timeout = command.get('timeout', 10)
-        poll = command.get('poll', 0.1)
         expression = command['expression']
         sub_commands = command.get('sub_commands', [])
 
-        end_time = time() + timeout
-        while self.engine.execute_command({
-                'provider': 'python',
-                'type': 'exec',
-                'expression': expression,
-                }):
+        def run_sub_commands():
             for sub_cmd in sub_commands:
                 self.engine.execute_command(sub_cmd)
-            if timeout:
-                if time() > end_time:
-                    raise TimeoutException(command, timeout)
-            if poll:
-                sleep(poll)
+
+        def check():
+            return bool(self.engine.evaluate(expression, **kwargs)) is \
+                stop_value
+
+        waiter = self._get_waiter(command)
+        iterations = 0
+        last_elapsed = max_elapsed = None
+        try:
+            # rendered sub commands are copies owned by this execution
+            with self.engine.compiled(sub_commands):
+                while True:
+                    timer = Timer()
+                    if sub_commands_first:
+                        run_sub_commands()
+                    done = check()
+                    if not done and not sub_commands_first:
+                        run_sub_commands()
+                    last_elapsed = timer.stop().elapsed
+                    if max_elapsed is None or last_elapsed > max_elapsed:
+                        max_elapsed = last_elapsed
+                    iterations += 1
+                    if done:
+                        return
+                    if not waiter.wait():
+                        if not sub_commands_first and check():
+                            # the condition turned false at the deadline
+                            return
+                        raise TimeoutException(command, waiter.timeout)
+        finally:
+            self.engine.update_variables({
+                '_loop_iterations': iterations,
+                '_loop_waited': waiter.waited,
+                '_loop_last_elapsed': last_elapsed,
+                '_loop_max_elapsed': max_elapsed,
+            })
+
+    def command_while(self, command, **kwargs):
+        """ While expression is true-ish
+        """
+        self._loop(command, kwargs, False, False)
 
     def command_wait_until(self, command, **kwargs):
         """ Wait until an expression is not False
         """
-        timeout = command.get('timeout', 10)
-        poll = command.get('poll', 0.1)
-        expression = command['expression']
-        sub_commands = command.get('sub_commands', [])
-
-        end_time = time() + timeout
-        while True:
-            for sub_cmd in sub_commands:
-                self.engine.execute_command(sub_cmd)
-            if self.engine.execute_command({
-                    'provider': 'python',
-                    'type': 'exec',
-                    'expression': expression,
-                    }):
-                return
-            if timeout:
-                if time() > end_time:
-                    break
-            if poll:
-                sleep(poll)
-        raise TimeoutException(command, timeout)
+        self._loop(command, kwargs, True, True)
 
     def command_wait_until_not(self, command, **kwargs):
         """ Wait until an expression is False
         """
-        timeout = command.get('timeout', 10)
-        poll = command.get('poll', 0.1)
-        expression = command['expression']
-        sub_commands = command.get('sub_commands', [])
+        self._loop(command, kwargs, False, True)
 
-        end_time = time() + timeout
-        while True:
-            for sub_cmd in sub_commands:
-                self.engine.execute_command(sub_cmd)
-            if not self.engine.execute_command({
-                    'provider': 'python',
-                    'type': 'exec',
-                    'expression': expression,
-                    }):
-                return
-            if timeout:
-                if time() > end_time:
-                    break
-            if poll:
-                sleep(poll)
-        raise TimeoutException(command, timeout)
+    def command_parallel(self, command, **kwargs):
+        """ Execute blocks of sub commands concurrently.
+
+            Each block works on its own copy of variables; updates are
+            merged back in blocks order once all blocks succeeded.
+            No more commands are started after the first failure.
+        """
+        blocks = command.get('blocks', [])
+        if not blocks:
+            return
+        max_workers = command.get(
+            'max_workers', min(len(blocks), PARALLEL_MAX_WORKERS))
+        snapshot = dict(self.engine.variables)
+        engines = [self.engine.fork(dict(snapshot)) for block in blocks]
+        errors = []
+
+        def execute_block(engine, block):
+            for sub_cmd in block:
+                if errors:
+                    return
+                try:
+                    engine.execute_command(sub_cmd)
+                except Exception as e:
+                    errors.append(e)
+                    return
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            for engine, block in zip(engines, blocks):
+                executor.submit(execute_block, engine, block)
+        if errors:
+            raise errors[0]
+
+        for engine in engines:
+            self.engine.update_variables(dict(
+                (name, value) for name, value in engine.variables.items()
+                if name not in snapshot or snapshot[name] is not value))
 
     def _exec(self, expression, context):
         """ Evaluate a python expression against a given context
         """
-
-        context = context.copy()
-        return RestrictionCapableEval(expression).eval(context)
+        return compile_expression(expression).eval(context)
@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+""" Process-wide cache of parsed YAML scenarios.
+
+Files are keyed by path and checked against their mtime and size
+on every lookup; parsed documents are keyed by a content hash so
+the same text is parsed once, no matter where it comes from
+(collection, setup, every ``test_data`` variant or repeat iteration,
+``execute_raw`` calls).
+
+Cached documents are shared: they must be treated as read only.
+Compiled plans of their steps are stored along with them, so each step
+is compiled once per process whatever the number of engines, tests,
+``test_data`` variants or repeats executing it.
+"""
+import hashlib
+import json
+import os
+import threading
+from collections import (
+    OrderedDict,
+    namedtuple,
+)
+
+import yaml
+
+from .plan import PlanCache
+from .yaml_backend import yaml_backend
+
+
+ParsedScenario = namedtuple(
+    'ParsedScenario', ['digest', 'text', 'documents', 'plans'])
+
+
+def scenario_steps(documents):
+    """ Return the steps document of parsed scenario documents """
+    if documents and isinstance(documents[-1], list):
+        return documents[-1]
+    return []
+
+
+def load_metadata(text):
+    """ Return the metadata document of a scenario, if any, parsing
+        just the first YAML document of the given text.
+
+        Scenarios starting with a list of steps have no metadata and
+        the steps document is not parsed at all.
+    """
+    loader = yaml_backend.Loader(text)
+    try:
+        loader.get_event()
+        if loader.check_event(yaml.StreamEndEvent):
+            return None
+        loader.get_event()
+        if loader.check_event(yaml.SequenceStartEvent):
+            return None
+    finally:
+        loader.dispose()
+    loader = yaml_backend.Loader(text)
+    try:
+        metadata = loader.get_data()
+        if not loader.check_data():
+            # a single document scenario, no metadata
+            return None
+        return metadata
+    finally:
+        loader.dispose()
+
+
+def content_digest(text):
+    """ Return the content hash of a scenario text """
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+class ScenarioCache(object):
+    """ Parsed scenarios cache """
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._files = {}
+        self._metadata = {}
+        self._parsed = OrderedDict()
+        self._steps = {}
+        self._lock = threading.RLock()
+
+    def parse(self, text):
+        """ Return the parsed scenario for the given text """
+        return self._parse(content_digest(text), text)
+
+    def _parse(self, digest, text):
+        with self._lock:
+            scenario = self._parsed.get(digest)
+            if scenario is not None:
+                self.hits += 1
+                self._parsed.move_to_end(digest)
+                return scenario
+            self.misses += 1
+            documents = list(yaml_backend.load_all(text))
+            scenario = ParsedScenario(digest, text, documents, PlanCache())
+            self._parsed[digest] = scenario
+            for step in scenario_steps(documents):
+                self._steps[id(step)] = (step, scenario.plans)
+            if len(self._parsed) > self.maxsize:
+                evicted = self._parsed.popitem(last=False)[1]
+                for step in scenario_steps(evicted.documents):
+                    del self._steps[id(step)]
+            return scenario
+
+    def get_plan(self, command):
+        """ Return the compiled plan of a cached scenario step (compiled
+            on first use, stored with its scenario) or None if the given
+            command is not a cached step """
+        cached = self._steps.get(id(command))
+        if cached is not None and cached[0] is command:
+            return cached[1].add(command)
+        return None
+
+    def get(self, path):
+        """ Return the parsed scenario for the given file path.
+
+            The file is read again only if its mtime or size changed
+            and parsed again only if its contents changed too.
+        """
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == stat_key:
+                scenario = self._parsed.get(cached[1])
+                if scenario is not None:
+                    self.hits += 1
+                    self._parsed.move_to_end(cached[1])
+                    return scenario
+        with open(path, 'r') as file_obj:
+            text = file_obj.read()
+        digest = content_digest(text)
+        scenario = self._parse(digest, text)
+        with self._lock:
+            self._files[path] = (stat_key, digest)
+        return scenario
+
+    def get_metadata(self, path):
+        """ Return the metadata document for the given file path
+            without parsing the scenario steps (if not already parsed)
+        """
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        stat_key = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            cached = self._metadata.get(path)
+            if cached is not None and cached[0] == stat_key:
+                return cached[1]
+            cached = self._files.get(path)
+            if cached is not None and cached[0] == stat_key and \
+                    cached[1] in self._parsed:
+                documents = self._parsed[cached[1]].documents
+                return documents[0] if len(documents) > 1 else None
+        with open(path, 'r') as file_obj:
+            metadata = load_metadata(file_obj.read())
+        with self._lock:
+            self._metadata[path] = (stat_key, metadata)
+        return metadata
+
+    def clear(self):
+        """ Invalidate all cached scenarios """
+        with self._lock:
+            self._files.clear()
+            self._metadata.clear()
+            self._parsed.clear()
+            self._steps.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class CollectionCache(object):
+    """ Persistent collection metadata cache.
+
+        Per file metadata documents are stored in the pytest ``cache``
+        (``config.cache``) along with the file mtime, size and content hash
+        so unchanged files are not parsed at all in the following sessions.
+    """
+
+    key = 'pytest-play/collection'
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.entries = cache.get(self.key, {})
+        self.dirty = False
+
+    def get_metadata(self, path):
+        """ Return the metadata document for the given file path """
+        path = os.path.abspath(str(path))
+        stat = os.stat(path)
+        entry = self.entries.get(path)
+        if entry is not None and entry['mtime'] == stat.st_mtime_ns and \
+                entry['size'] == stat.st_size:
+            return entry['metadata']
+        with open(path, 'r') as file_obj:
+            text = file_obj.read()
+        digest = content_digest(text)
+        if entry is not None and entry['digest'] == digest:
+            metadata = entry['metadata']
+        else:
+            metadata = load_metadata(text)
+            try:
+                if json.loads(json.dumps(metadata)) != metadata:
+                    raise ValueError(metadata)
+            except (TypeError, ValueError):
+                # not JSON serializable, don't cache it
+                self.entries.pop(path, None)
+                self.dirty = True
+                return metadata
+        self.entries[path] = {
+            'mtime': stat.st_mtime_ns,
+            'size': stat.st_size,
+            'digest': digest,
+            'metadata': metadata,
+        }
+        self.dirty = True
+        return metadata
+
+    def save(self):
+        """ Store collected metadata, if changed """
+        if self.dirty:
+            self.cache.set(self.key, self.entries)
+            self.dirty = False
+
+
+scenario_cache = ScenarioCache()
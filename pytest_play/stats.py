@@ -0,0 +1,117 @@
+# -*- coding: utf-8 -*-
+""" Session scoped statsd clients.
+
+One statsd client (one UDP socket, one ``stats_host`` DNS resolution)
+is created per session and reused for every recorded metric.
+
+With ``--stats-batch-size`` metrics are buffered in a statsd pipeline
+and sent in batches (multiple metrics per UDP packet) when the batch
+size or the ``--stats-flush-interval`` is reached and at session end.
+The flush interval is checked by a background thread too, so buffered
+metrics are not delayed when no more metrics are recorded.
+"""
+import threading
+import time
+
+
+class BufferedStatsClient(object):
+    """ Buffer metrics in a statsd pipeline flushing them on batch
+        size or interval """
+
+    def __init__(self, client, batch_size, flush_interval=None):
+        self.client = client
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pipeline = client.pipeline()
+        self._size = 0
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._closed = threading.Event()
+        self._flusher = None
+        if flush_interval:
+            self._flusher = threading.Thread(
+                target=self._flush_periodically, name='play-stats-flusher')
+            self._flusher.daemon = True
+            self._flusher.start()
+
+    def timing(self, stat, delta, rate=1):
+        self._add('timing', stat, delta, rate)
+
+    def gauge(self, stat, value, rate=1, delta=False):
+        self._add('gauge', stat, value, rate, delta)
+
+    def incr(self, stat, count=1, rate=1):
+        self._add('incr', stat, count, rate)
+
+    def _add(self, method, *args):
+        with self._lock:
+            getattr(self._pipeline, method)(*args)
+            self._size += 1
+            if self._size >= self.batch_size or (
+                    self.flush_interval is not None and
+                    time.monotonic() - self._last_flush >=
+                    self.flush_interval):
+                self._flush()
+
+    def _flush_periodically(self):
+        while not self._closed.wait(self.flush_interval):
+            with self._lock:
+                if self._size and time.monotonic() - self._last_flush >= \
+                        self.flush_interval:
+                    self._flush()
+
+    def _flush(self):
+        self._pipeline.send()
+        self._size = 0
+        self._last_flush = time.monotonic()
+
+    def flush(self):
+        """ Send buffered metrics """
+        with self._lock:
+            self._flush()
+
+    def close(self):
+        self._closed.set()
+        if self._flusher is not None:
+            self._flusher.join()
+        self.flush()
+        self.client.close()
+
+
+def make_statsd_client(config):
+    """ Return a new statsd client for the given pytest config """
+    import statsd
+    client = statsd.StatsClient(
+        config.getoption('stats_host'),
+        config.getoption('stats_port'),
+        prefix=config.getoption('stats_prefix'))
+    batch_size = config.getoption('stats_batch_size', 0)
+    if batch_size and batch_size > 1:
+        client = BufferedStatsClient(
+            client,
+            batch_size,
+            flush_interval=config.getoption('stats_flush_interval', None))
+    return client
+
+
+_lock = threading.Lock()
+
+
+def get_statsd_client(config):
+    """ Return the session statsd client (created on first use) """
+    client = getattr(config, '_play_statsd_client', None)
+    if client is None:
+        with _lock:
+            client = getattr(config, '_play_statsd_client', None)
+            if client is None:
+                client = config._play_statsd_client = \
+                    make_statsd_client(config)
+    return client
+
+
+def close_statsd_client(config):
+    """ Flush and close the session statsd client, if any """
+    client = getattr(config, '_play_statsd_client', None)
+    if client is not None:
+        config._play_statsd_client = None
+        client.close()
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+""" Per command timing sinks.
+
+Every executed command elapsed time is sent to a timing sink:
+
+* ``print``, print the command and its elapsed time on stdout (default,
+  captured by pytest and reported in JUnit XML ``system-out``)
+* ``none``, discard timings
+* ``ring[:size]``, keep the latest ``size`` timing records in memory
+* ``jsonl:path``, stream compact JSON lines records to a file
+
+Elapsed times are measured with monotonic high resolution timers
+(``time.perf_counter_ns``), not wall-clock time.
+"""
+import json
+import re
+import string
+import threading
+import time
+from collections import deque
+from fnmatch import fnmatchcase
+
+try:
+    from time import perf_counter_ns, process_time_ns
+except ImportError:  # python < 3.7
+    def perf_counter_ns():
+        return int(time.perf_counter() * 1e9)
+
+    def process_time_ns():
+        return int(time.process_time() * 1e9)
+
+
+class Timer(object):
+    """ Monotonic command timer with nanoseconds resolution.
+
+        With ``cpu=True`` the process CPU time spent (all threads)
+        is measured too.
+    """
+
+    __slots__ = ('start_ns', 'elapsed_ns', 'cpu_start_ns', 'cpu_elapsed_ns')
+
+    def __init__(self, cpu=False):
+        self.elapsed_ns = None
+        self.cpu_elapsed_ns = None
+        self.cpu_start_ns = process_time_ns() if cpu else None
+        self.start_ns = perf_counter_ns()
+
+    def stop(self):
+        """ Stop the timer, returning itself """
+        self.elapsed_ns = perf_counter_ns() - self.start_ns
+        if self.cpu_start_ns is not None:
+            self.cpu_elapsed_ns = process_time_ns() - self.cpu_start_ns
+        return self
+
+    @property
+    def elapsed(self):
+        """ Elapsed seconds """
+        return self.elapsed_ns / 1e9
+
+    @property
+    def cpu_elapsed(self):
+        """ CPU seconds, if measured """
+        if self.cpu_elapsed_ns is not None:
+            return self.cpu_elapsed_ns / 1e9
+
+
+class PrintSink(object):
+    """ Print commands with their elapsed time """
+
+    def record(self, engine, command, elapsed):
+        print(dict(command, _elapsed=elapsed))
+
+    def close(self):
+        pass
+
+
+class NullSink(object):
+    """ Discard timings """
+
+    def record(self, engine, command, elapsed):
+        pass
+
+    def close(self):
+        pass
+
+
+def timing_record(engine, command, elapsed):
+    """ Compact timing record """
+    node = getattr(engine.request, 'node', None)
+    return {
+        'time': time.time(),
+        'test': getattr(node, 'nodeid', None),
+        'provider': command.get('provider'),
+        'type': command.get('type'),
+        'elapsed': elapsed,
+    }
+
+
+class RingBufferSink(object):
+    """ Keep the latest timing records in memory """
+
+    def __init__(self, size=1000):
+        self.records = deque(maxlen=size)
+
+    def record(self, engine, command, elapsed):
+        self.records.append(timing_record(engine, command, elapsed))
+
+    def close(self):
+        pass
+
+
+class JSONLinesSink(object):
+    """ Stream timing records to a JSON lines file """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', buffering=1)
+        self._lock = threading.Lock()
+
+    def record(self, engine, command, elapsed):
+        line = json.dumps(
+            timing_record(engine, command, elapsed), default=str)
+        with self._lock:
+            self._file.write(line + '\n')
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class MetricNameFormatter(string.Formatter):
+    """ Format metric names, missing fields are empty """
+
+    def get_value(self, key, args, kwargs):
+        value = kwargs.get(key)
+        return '' if value is None else value
+
+
+class AutoMetrics(object):
+    """ Record the elapsed time of every command matching one of the
+        given patterns as a ``timing`` metric (statsd, JUnit XML
+        properties, histograms) through the ``metrics`` provider.
+
+        Patterns are matched against ``provider.type`` and against
+        the command ``comment``; metric names are built from a template
+        with command fields and ``test`` (the test name).
+    """
+
+    default_name = '{provider}.{type}'
+
+    def __init__(self, patterns=('*',), name=None):
+        self.patterns = tuple(patterns)
+        self.name = name or self.default_name
+        self._formatter = MetricNameFormatter()
+
+    def matches(self, command):
+        """ True if the given command should be instrumented """
+        key = '{0}.{1}'.format(
+            command.get('provider', 'default'), command.get('type'))
+        comment = command.get('comment')
+        for pattern in self.patterns:
+            if fnmatchcase(key, pattern) or \
+                    comment is not None and fnmatchcase(comment, pattern):
+                return True
+        return False
+
+    def metric_name(self, engine, command):
+        """ Metric name for the given command """
+        node = getattr(engine.request, 'node', None)
+        fields = dict(command, test=getattr(node, 'name', None))
+        fields.setdefault('provider', 'default')
+        name = self._formatter.format(self.name, **fields)
+        return re.sub(r'[^\w.\-]+', '_', name)
+
+    def record(self, engine, command, elapsed):
+        if self.matches(command):
+            engine.get_command_provider('metrics').record_property(
+                self.metric_name(engine, command), elapsed,
+                metric_type='timing', meas_unit='s')
+
+
+def make_auto_metrics(patterns, name=None):
+    """ Return auto metrics for comma separated patterns """
+    patterns = [
+        pattern.strip() for pattern in patterns.split(',')
+        if pattern.strip()]
+    if not patterns:
+        raise ValueError('No auto metrics patterns', patterns)
+    return AutoMetrics(patterns, name=name)
+
+
+def make_sink(spec):
+    """ Return a timing sink for the given specification
+        (``print``, ``none``, ``ring[:size]`` or ``jsonl:path``)
+    """
+    name, sep, arg = spec.partition(':')
+    if name == 'print' and not sep:
+        return PrintSink()
+    if name == 'none' and not sep:
+        return NullSink()
+    if name == 'ring':
+        return RingBufferSink(int(arg)) if sep else RingBufferSink()
+    if name == 'jsonl' and arg:
+        return JSONLinesSink(arg)
+    raise ValueError('Invalid timing sink', spec)
+
+
+_sink = PrintSink()
+
+
+def get_timing_sink():
+    """ Return the default timing sink """
+    return _sink
+
+
+def set_timing_sink(sink):
+    """ Set the default timing sink, returning the previous one """
+    global _sink
+    previous, _sink = _sink, sink
+    return previous
@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+""" Wait primitives for polling commands.
+
+Polling commands (e.g., ``wait_until``) wait between attempts with a
+``Waiter``:
+
+* the delay starts from ``poll`` seconds and may grow exponentially
+  (``backoff`` factor, up to ``max_poll`` seconds) with random
+  ``jitter`` (a fraction of the delay)
+* waits never oversleep the ``timeout`` deadline, so a final attempt
+  is always made at the deadline
+* waits end early when the engine ``WakeSignal`` is notified (e.g.,
+  a provider receiving a message calls ``engine.wake()``)
+"""
+import random
+import threading
+from time import (
+    monotonic,
+    sleep,
+)
+
+
+class WakeSignal(object):
+    """ Wake up waiting commands """
+
+    def __init__(self):
+        self.generation = 0
+        self._condition = threading.Condition()
+
+    def notify(self):
+        """ Wake up all waiters """
+        with self._condition:
+            self.generation += 1
+            self._condition.notify_all()
+
+    def wait(self, timeout, generation):
+        """ Wait up to timeout seconds for a notification newer than
+            the given generation, returning True if notified """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self.generation != generation, timeout)
+
+
+class Waiter(object):
+    """ Wait between attempts of a polling command """
+
+    def __init__(self, signal=None, timeout=None, poll=0.1, backoff=1.,
+                 max_poll=None, jitter=0.):
+        self.signal = signal
+        self.timeout = timeout
+        self.poll = poll
+        self.backoff = backoff
+        self.max_poll = max_poll
+        self.jitter = jitter
+        self.start_time = monotonic()
+        self.deadline = self.start_time + timeout if timeout else None
+        self.attempts = 1
+        self.waited = 0.
+        self._delay = poll
+        self._generation = signal.generation if signal is not None else 0
+
+    @property
+    def elapsed(self):
+        """ Seconds since the waiter was created """
+        return monotonic() - self.start_time
+
+    def expired(self):
+        """ True if the deadline is over """
+        return self.deadline is not None and monotonic() >= self.deadline
+
+    def next_delay(self):
+        """ Return the next delay (backoff and jitter applied) """
+        delay = self._delay or 0.
+        if self.jitter and delay:
+            delay *= 1 + random.uniform(-self.jitter, self.jitter)
+        if self._delay and self.backoff != 1:
+            self._delay *= self.backoff
+            if self.max_poll is not None:
+                self._delay = min(self._delay, self.max_poll)
+        return delay
+
+    def wait(self):
+        """ Wait before the next attempt. Returns False if the deadline
+            is over (no more attempts) """
+        delay = self.next_delay()
+        if self.deadline is not None:
+            remaining = self.deadline - monotonic()
+            if remaining <= 0:
+                return False
+            delay = min(delay, remaining)
+        if delay > 0:
+            start_time = monotonic()
+            if self.signal is not None:
+                self.signal.wait(delay, self._generation)
+            else:
+                sleep(delay)
+            self.waited += monotonic() - start_time
+        if self.signal is not None:
+            self._generation = self.signal.generation
+        self.attempts += 1
+        return True
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+""" YAML backend.
+
+The ``libyaml`` based ``CSafeLoader``/``CSafeDumper`` classes are used
+if PyYAML was built with libyaml, the pure Python ones otherwise
+(see the ``--play-yaml-backend`` command line option).
+"""
+import yaml
+
+from .config import LIBYAML
+
+
+BACKENDS = {
+    'python': (yaml.SafeLoader, yaml.SafeDumper),
+}
+if LIBYAML:
+    BACKENDS['libyaml'] = (yaml.CSafeLoader, yaml.CSafeDumper)
+
+
+class YAMLBackend(object):
+    """ Safe YAML loader and dumper """
+
+    def __init__(self, name='auto'):
+        self.use(name)
+
+    def use(self, name='auto'):
+        """ Switch backend: ``auto``, ``libyaml`` or ``python`` """
+        if name == 'auto':
+            name = 'libyaml' if LIBYAML else 'python'
+        if name not in BACKENDS:
+            raise ValueError('YAML backend not available', name)
+        self.name = name
+        self.Loader, self.Dumper = BACKENDS[name]
+
+    def load(self, data):
+        """ Parse the first document """
+        return yaml.load(data, Loader=self.Loader)
+
+    def load_all(self, data):
+        """ Parse all documents """
+        return yaml.load_all(data, Loader=self.Loader)
+
+    def dump(self, data, **kwargs):
+        """ Serialize data """
+        return yaml.dump(data, Dumper=self.Dumper, **kwargs)
+
+
+yaml_backend = YAMLBackend()
@@ -21,6 +21,7 @@ install_requires = [
     'zope.component',
     'RestrictedPython>=4.0b2',
     'parametrizer>=0.0.3',
+    'importlib_metadata; python_version < "3.8"',
 ]
 
 statsd_require = [
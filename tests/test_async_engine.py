@@ -0,0 +1,115 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+class AsyncProvider(object):
+
+    def __init__(self, engine):
+        self.engine = engine
+
+    async def command_sleep(self, command, **kwargs):
+        await asyncio.sleep(float(command['seconds']))
+        return command['seconds']
+
+    def command_thread(self, command, **kwargs):
+        self.engine.variables['thread'] = threading.get_ident()
+
+    def command_nested(self, command, **kwargs):
+        return self.engine.execute_command(
+            {'provider': 'async', 'type': 'sleep', 'seconds': 0})
+
+
+@pytest.fixture
+def async_play(request):
+    from pytest_play.async_engine import AsyncPlayEngine
+    engine = AsyncPlayEngine(request, {})
+    engine.register_command_provider(AsyncProvider, 'async')
+    yield engine
+    engine.teardown()
+
+
+def run(coro):
+    loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(coro)
+    finally:
+        loop.close()
+
+
+def test_async_command(async_play):
+    assert run(async_play.execute_command_async(
+        {'provider': 'async', 'type': 'sleep', 'seconds': 0.1})) == 0.1
+    assert async_play.variables['_elapsed'] >= 0.1
+
+
+def test_async_sync_command_thread_pool(async_play):
+    run(async_play.execute_command_async(
+        {'provider': 'async', 'type': 'thread'}))
+    assert async_play.variables['thread'] != threading.get_ident()
+
+
+def test_async_nested_command(async_play):
+    assert run(async_play.execute_command_async(
+        {'provider': 'async', 'type': 'nested'})) == 0
+
+
+def test_async_command_sync_api(async_play):
+    assert async_play.execute_command(
+        {'provider': 'async', 'type': 'sleep', 'seconds': 0}) == 0
+
+
+def test_async_execute_raw(async_play):
+    run(async_play.execute_raw_async("""
+---
+- provider: python
+  type: store_variable
+  name: foo
+  expression: "1"
+- provider: python
+  type: assert
+  expression: "False"
+  skip_condition: "variables['foo'] == 1"
+- provider: async
+  type: sleep
+  seconds: $foo
+  skip_condition: "True"
+    """, extra_variables={'bar': 2}))
+    assert async_play.variables['foo'] == 1
+    assert async_play.variables['bar'] == 2
+
+
+def test_async_concurrent_engines(request):
+    from pytest_play.async_engine import AsyncPlayEngine
+    engines = [AsyncPlayEngine(request, {}) for i in range(5)]
+    for engine in engines:
+        engine.register_command_provider(AsyncProvider, 'async')
+    steps = [{'provider': 'async', 'type': 'sleep', 'seconds': 0.2}]
+
+    async def execute_all():
+        await asyncio.gather(
+            *[engine.execute_async(steps) for engine in engines])
+    start_time = time.time()
+    run(execute_all())
+    assert time.time() - start_time < 0.2 * len(engines)
+
+
+def test_async_command_failure(async_play):
+    with pytest.raises(AssertionError):
+        run(async_play.execute_command_async(
+            {'provider': 'python', 'type': 'assert',
+             'expression': '0'}))
+    assert '_elapsed' in async_play.variables
+
+
+def test_async_fork_executor(request):
+    from concurrent.futures import ThreadPoolExecutor
+    from pytest_play.async_engine import AsyncPlayEngine
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        engine = AsyncPlayEngine(request, {}, executor=executor)
+        forked = engine.fork({'foo': 'bar'})
+        assert isinstance(forked, AsyncPlayEngine)
+        assert forked.executor is executor
+        assert forked.variables == {'foo': 'bar'}
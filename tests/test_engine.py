@@ -1,3 +1,4 @@
+import os
 import pytest
 import mock
 
@@ -335,3 +336,268 @@ def test_elapsed_variable(play):
     assert '_elapsed' not in play.variables
     play.execute_command(command)
     assert float(play.variables['_elapsed']) > 0
+
+
+def test_provider_factories_cached(request):
+    from pytest_play import engine
+    from pytest_play.providers import PythonProvider
+    engine.get_provider_factories.cache_clear()
+    with mock.patch.object(engine, 'entry_points',
+                           wraps=engine.entry_points) as entry_points:
+        engine.PlayEngine(request, {})
+        engine.PlayEngine(request, {})
+        assert entry_points.call_count == 1
+    assert engine.get_provider_factories()['python'] is PythonProvider
+
+
+def test_provider_lazy_instance(request):
+    from pytest_play.engine import PlayEngine
+    executor = PlayEngine(request, {})
+    dummy_provider = mock.MagicMock()
+    executor.register_command_provider(dummy_provider, 'newprovider')
+    assert not dummy_provider.called
+    provider = executor.get_command_provider('newprovider')
+    assert provider is dummy_provider.return_value
+    assert executor.get_command_provider('newprovider') is provider
+    assert dummy_provider.assert_called_once_with(executor) is None
+
+
+def test_provider_per_engine(request):
+    from zope import component
+    from pytest_play.engine import (
+        ICommandProvider,
+        PlayEngine,
+    )
+    executor1 = PlayEngine(request, {})
+    executor2 = PlayEngine(request, {})
+    provider1 = executor1.get_command_provider('python')
+    provider2 = executor2.get_command_provider('python')
+    assert provider1 is not provider2
+    assert provider1.engine is executor1
+    assert provider2.engine is executor2
+    assert executor1.gsm.getUtility(
+        ICommandProvider, name='python') is provider1
+    # global fallback registration (last instantiated wins)
+    assert component.queryUtility(
+        ICommandProvider, name='python') is provider2
+    fork = executor1.fork({})
+    assert fork.get_command_provider('python') is not provider1
+    assert component.queryUtility(
+        ICommandProvider, name='python') is provider2
+
+
+def test_provider_global_utility(request):
+    from zope import component
+    from pytest_play.engine import (
+        ICommandProvider,
+        PlayEngine,
+    )
+    gsm = component.getGlobalSiteManager()
+    provider = mock.MagicMock()
+    gsm.registerUtility(provider, ICommandProvider, 'globalprovider')
+    try:
+        executor = PlayEngine(request, {})
+        assert executor.get_command_provider('globalprovider') is provider
+    finally:
+        gsm.unregisterUtility(provider, ICommandProvider, 'globalprovider')
+
+
+def test_fork(play):
+    factory = mock.MagicMock()
+    play.register_command_provider(factory, 'dummy')
+    forked = play.fork({'foo': 'bar'})
+    assert forked.variables == {'foo': 'bar'}
+    assert forked.request is play.request
+    assert forked.get_command_provider('dummy') is factory.return_value
+    forked.register_teardown_callback(factory)
+    assert factory in play._teardown
+
+
+def test_execute_includes_cached(play, data_base_path, monkeypatch):
+    from pytest_play.scenarios import scenario_cache
+    monkeypatch.chdir(data_base_path)
+    command = {'type': 'include', 'provider': 'include',
+               'path': 'included.yml'}
+    play.execute_command(command)
+    misses = scenario_cache.misses
+    for i in range(3):
+        play.execute_command(command)
+    assert scenario_cache.misses == misses
+    assert play.variables['included'] == 1
+    provider = play.get_command_provider('include')
+    assert provider.get_path('included.yml') == os.path.join(
+        data_base_path, 'included.yml')
+    monkeypatch.chdir(os.path.dirname(data_base_path))
+    assert provider.get_path('included.yml') == os.path.join(
+        data_base_path, 'included.yml')
+
+
+def test_skip_condition_fast_path(play):
+    command = {'provider': 'python',
+               'type': 'assert',
+               'expression': 'True'}
+    with mock.patch.object(
+            play, 'render_command', wraps=play.render_command) as render:
+        assert play._is_skipped(command) is False
+        assert render.called is False
+
+
+def test_skip_condition_direct(play):
+    play.variables['foo'] = 'bar'
+    with mock.patch.object(
+            play, 'execute_command', wraps=play.execute_command) as execute:
+        assert play._is_skipped(
+            {'provider': 'python', 'type': 'assert', 'expression': 'True',
+             'skip_condition': '"$foo" == "bar"'}) is True
+        assert play._is_skipped(
+            {'provider': 'python', 'type': 'assert', 'expression': 'True',
+             'skip_condition': 'variables["foo"] != "bar"'}) is False
+        assert execute.called is False
+    assert '_elapsed' not in play.variables
+
+
+@pytest.mark.parametrize('condition,expected', [
+    (True, True),
+    (False, False),
+    (0, False),
+])
+def test_skip_condition_not_string(play, condition, expected):
+    assert play._is_skipped(
+        {'provider': 'python', 'type': 'assert', 'expression': 'False',
+         'skip_condition': condition}) is expected
+
+
+def test_evaluate(play):
+    play.variables['foo'] = 2
+    assert play.evaluate('variables["foo"] * 2') == 4
+    assert play.evaluate('variables["foo"] * bar', bar=3) == 6
+    assert '_elapsed' not in play.variables
+    with pytest.raises(Exception):
+        play.evaluate('bar')
+
+
+def test_evaluate_elapsed_untouched(play):
+    play.execute_command({
+        'provider': 'python',
+        'type': 'sleep',
+        'seconds': 0.05})
+    elapsed = play.variables['_elapsed']
+    with mock.patch.object(
+            play, 'execute_command', wraps=play.execute_command) as execute:
+        play.evaluate('1 + 1')
+        assert execute.called is False
+    assert play.variables['_elapsed'] == elapsed
+
+
+def test_record_elapsed_after_record_property(play):
+    play.get_command_provider('metrics')._record_property = mock.MagicMock()
+    play.execute([{
+        'provider': 'python',
+        'type': 'sleep',
+        'seconds': 0.05}, {
+        'provider': 'metrics',
+        'type': 'record_property',
+        'name': 'answer',
+        'expression': '42'}, {
+        'provider': 'python',
+        'type': 'assert',
+        'expression': 'variables["_elapsed"] < 0.05'}])
+    assert play.variables['answer'] == 42
+
+
+def test_default_command_cached(play):
+    from pytest_play import engine
+    from pytest_play.scenarios import scenario_cache
+    play.variables['token'] = 'a'
+    play.variables['include'] = {
+        'headers': {'Authorization': '$token', 'Accept': 'json'}}
+    play.get_command_provider = mock.MagicMock()
+    command = scenario_cache.parse(
+        "- {provider: include, type: include, headers: {Accept: xml}}"
+    ).documents[-1][0]
+    play.prepare([command])
+    with mock.patch.object(
+            engine, 'compile_plan', wraps=engine.compile_plan) as compile:
+        play.execute_command(command)
+        play.variables['token'] = 'b'
+        play.execute_command(command)
+        assert compile.call_count == 1
+        # reassigned
+        play.variables['include'] = {'headers': {'Authorization': 'c'}}
+        play.execute_command(command)
+        assert compile.call_count == 2
+    calls = play.get_command_provider.return_value.command_include \
+        .call_args_list
+    assert [call[0][0]['headers'] for call in calls] == [
+        {'Authorization': 'a', 'Accept': 'xml'},
+        {'Authorization': 'b', 'Accept': 'xml'},
+        {'Authorization': 'c', 'Accept': 'xml'},
+    ]
+    assert play.variables['include'] == {'headers': {'Authorization': 'c'}}
+
+
+def test_default_command_legacy(play):
+    play.compile_commands = False
+    play.variables['token'] = 'a'
+    play.variables['include'] = {'headers': {'Authorization': '$token'}}
+    play.get_command_provider = mock.MagicMock()
+    play.execute_command({'provider': 'include', 'type': 'include'})
+    play.get_command_provider.return_value.command_include \
+        .assert_called_once_with({
+            'provider': 'include', 'type': 'include',
+            'headers': {'Authorization': 'a'}})
+
+
+def test_merge(play):
+    a = {'a': 1, 'b': {'c': 1, 'd': [1]}, 'e': {'f': 1}}
+    b = {'a': 2, 'b': {'d': [2], 'g': 1}, 'e': 'h'}
+    assert play._merge(a, b) is a
+    assert a == {'a': 2, 'b': {'c': 1, 'd': [2], 'g': 1}, 'e': 'h'}
+
+
+def test_execute_command_changed_in_place(play):
+    command = {'provider': 'python',
+               'type': 'store_variable',
+               'name': 'x',
+               'expression': '1'}
+    play.execute_command(command)
+    assert play.variables['x'] == 1
+    command['expression'] = '2'
+    play.execute_command(command)
+    assert play.variables['x'] == 2
+
+
+def test_prepare_cached(play, request):
+    from pytest_play import plan as plan_module
+    from pytest_play.scenarios import scenario_cache
+    steps = scenario_cache.parse("""
+- provider: python
+  type: store_variable
+  name: x
+  expression: $value + 1
+- provider: python
+  type: store_variable
+  name: y
+  expression: "2"
+""").documents[-1]
+    play.prepare(steps)
+    plan = play.get_plan(steps[0])
+    assert play.get_plan(steps[0]) is plan
+    # shared by other engines (e.g., the next test or test_data row)
+    other = play.__class__(request, {'value': 1})
+    with mock.patch.object(
+            plan_module, 'compile_plan',
+            wraps=plan_module.compile_plan) as compile:
+        other.prepare(steps)
+        other.execute(steps)
+        other.execute(steps)
+    assert other.get_plan(steps[0]) is plan
+    assert compile.call_count == 0
+    assert other.variables['x'] == 2
+    assert other.variables['y'] == 2
+
+
+def test_get_plan_not_cached(play):
+    command = {'provider': 'python', 'type': 'assert', 'expression': '1'}
+    play.prepare([command])
+    assert play.get_plan(command) is not play.get_plan(command)
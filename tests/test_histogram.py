@@ -0,0 +1,148 @@
+import pytest
+
+
+def test_histogram():
+    from pytest_play.histogram import Histogram
+    histogram = Histogram()
+    for value in range(1, 1001):
+        histogram.record(value / 1000.)
+    summary = histogram.summary()
+    assert summary['count'] == 1000
+    assert summary['min'] == 0.001
+    assert summary['max'] == 1.
+    assert summary['mean'] == pytest.approx(0.5005)
+    assert summary['p50'] == pytest.approx(0.5, rel=0.01)
+    assert summary['p90'] == pytest.approx(0.9, rel=0.01)
+    assert summary['p99'] == pytest.approx(0.99, rel=0.01)
+    assert len(histogram.buckets) < 400
+
+
+def test_histogram_zero_negative():
+    from pytest_play.histogram import Histogram
+    histogram = Histogram()
+    for value in (-10, -1, 0, 0, 5):
+        histogram.record(value)
+    assert histogram.percentile(1) == -10
+    assert histogram.percentile(40) == pytest.approx(-1, rel=0.01)
+    assert histogram.percentile(50) == 0
+    assert histogram.percentile(100) == 5
+
+
+def test_histogram_empty():
+    from pytest_play.histogram import Histogram
+    summary = Histogram().summary()
+    assert summary['count'] == 0
+    assert summary['p50'] is None
+    assert summary['max'] is None
+
+
+def test_histograms():
+    from pytest_play.histogram import Histograms
+    histograms = Histograms()
+    assert not histograms
+    histograms.record('b', 1)
+    histograms.record('a', 2)
+    histograms.record('a', 4)
+    summary = histograms.summary()
+    assert [row['name'] for row in summary] == ['a', 'b']
+    assert summary[0]['count'] == 2
+    assert summary[0]['max'] == 4
+
+
+def test_histograms_session(testdir):
+    testdir.makefile(".yml", test_histograms_session="""
+---
+test_data:
+  - value: 10
+  - value: 20
+  - value: 30
+---
+- provider: metrics
+  type: record_property
+  name: query_time
+  expression: "$value * 1"
+- provider: metrics
+  type: record_property
+  name: label
+  expression: "'not a number'"
+    """)
+    junit_xml_file = testdir.tmpdir.join('results.xml')
+
+    result = testdir.runpytest(
+        '--play-histograms', '--junit-xml={0}'.format(junit_xml_file))
+
+    result.assert_outcomes(passed=3)
+    result.stdout.fnmatch_lines([
+        '*pytest-play metrics*',
+        'query_time * 3 * 30',
+    ])
+    assert 'label' not in result.stdout.str()
+    from xml.dom import minidom
+    xmldoc = minidom.parse(junit_xml_file.strpath)
+    properties = dict(
+        (node.getAttribute('name'), node.getAttribute('value'))
+        for node in xmldoc.getElementsByTagName('property')
+        if node.parentNode.parentNode.tagName == 'testsuite')
+    assert properties['query_time.count'] == '3'
+    assert float(properties['query_time.max']) == 30
+    assert float(properties['query_time.p50']) == pytest.approx(20, rel=0.01)
+
+
+def test_histograms_disabled(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: metrics
+  type: record_property
+  name: query_time
+  expression: "1"
+    """)
+
+    result = testdir.runpytest()
+
+    result.assert_outcomes(passed=1)
+    assert 'pytest-play metrics' not in result.stdout.str()
+
+
+def test_histogram_mean_zero():
+    from pytest_play.histogram import Histogram
+    histogram = Histogram()
+    histogram.record(-1)
+    histogram.record(1)
+    assert histogram.summary()['mean'] == 0
+
+
+def test_histograms_merge():
+    from pytest_play.histogram import Histograms
+    histograms = Histograms()
+    histograms.record('a', 1)
+    other = Histograms()
+    other.record('a', 3)
+    other.record('b', 2)
+    histograms.merge(other.export())
+    histograms.merge(Histograms().export())
+    summary = dict((row['name'], row) for row in histograms.summary())
+    assert summary['a']['count'] == 2
+    assert summary['a']['min'] == 1
+    assert summary['a']['max'] == 3
+    assert summary['a']['mean'] == 2
+    assert summary['b']['count'] == 1
+
+
+def test_histograms_load_processes(testdir):
+    testdir.makefile(".yml", test_histograms_load="""
+---
+- provider: metrics
+  type: record_property
+  name: answer
+  expression: "42"
+    """)
+
+    result = testdir.runpytest_subprocess(
+        '--play-histograms', '--play-load',
+        'users=2,iterations=5,processes=2')
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        '*pytest-play metrics*',
+        'answer * 10 * 42 * 42 * 42 * 42',
+    ])
@@ -0,0 +1,102 @@
+import os
+
+import pytest
+
+
+def _write(tmpdir, name, includes, extra=''):
+    tmpdir.join(name).write('---\n' + ''.join(
+        '- provider: include\n  type: include\n  path: {0}\n'.format(
+            tmpdir.join(path)) for path in includes) + extra)
+    return tmpdir.join(name).strpath
+
+
+def test_iter_includes():
+    from pytest_play.includes import iter_includes
+    commands = [
+        {'provider': 'include', 'type': 'include', 'path': '/a.yml'},
+        {'provider': 'include', 'type': 'include', 'path': '$base/b.yml'},
+        {'provider': 'python', 'type': 'while', 'sub_commands': [
+            {'provider': 'include', 'type': 'include', 'path': 'c.yml'}]},
+    ]
+    assert list(iter_includes(commands)) == [
+        os.path.abspath('/a.yml'), os.path.abspath('c.yml')]
+
+
+def test_include_graph(tmpdir):
+    from pytest_play.includes import IncludeGraph
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache()
+    _write(tmpdir, 'c.yml', [])
+    _write(tmpdir, 'b.yml', ['c.yml'])
+    a = _write(tmpdir, 'a.yml', ['b.yml', 'c.yml', 'b.yml'])
+    graph = IncludeGraph(cache)
+    graph.check(a)
+    assert graph.edges[a] == [
+        tmpdir.join('b.yml').strpath, tmpdir.join('c.yml').strpath]
+    # pre-warmed scenarios
+    assert cache.misses == 3
+    cache.get(tmpdir.join('c.yml').strpath)
+    assert cache.misses == 3
+    graph.check(a)
+    assert cache.misses == 3
+
+
+def test_include_graph_cycle(tmpdir):
+    from pytest_play.includes import IncludeGraph
+    from pytest_play.scenarios import ScenarioCache
+    _write(tmpdir, 'c.yml', ['a.yml'])
+    _write(tmpdir, 'b.yml', ['c.yml'])
+    a = _write(tmpdir, 'a.yml', ['b.yml'])
+    with pytest.raises(ValueError) as excinfo:
+        IncludeGraph(ScenarioCache()).check(a)
+    assert excinfo.value.args == (
+        'Include cycle',
+        ' -> '.join(tmpdir.join(name).strpath
+                    for name in ('a.yml', 'b.yml', 'c.yml', 'a.yml')))
+
+
+def test_include_graph_self(tmpdir):
+    from pytest_play.includes import IncludeGraph
+    from pytest_play.scenarios import ScenarioCache
+    a = _write(tmpdir, 'a.yml', ['a.yml'])
+    with pytest.raises(ValueError) as excinfo:
+        IncludeGraph(ScenarioCache()).check(a)
+    assert excinfo.value.args[0] == 'Include cycle'
+
+
+def test_include_graph_missing(tmpdir):
+    from pytest_play.includes import IncludeGraph
+    from pytest_play.scenarios import ScenarioCache
+    b = _write(tmpdir, 'b.yml', ['missing.yml'])
+    a = _write(tmpdir, 'a.yml', ['b.yml'])
+    with pytest.raises(ValueError) as excinfo:
+        IncludeGraph(ScenarioCache()).check(a)
+    assert excinfo.value.args == (
+        'Included file not found', tmpdir.join('missing.yml').strpath,
+        'included by', b)
+
+
+def test_check_includes_option(testdir):
+    _write(testdir.tmpdir, 'test_cycle.yml', ['other.yml'])
+    _write(testdir.tmpdir, 'other.yml', ['test_cycle.yml'])
+    _write(testdir.tmpdir, 'test_ok.yml', [], extra="""
+- provider: python
+  type: assert
+  expression: "1"
+""")
+
+    result = testdir.runpytest('--play-check-includes')
+
+    assert result.ret != 0
+    result.stdout.fnmatch_lines([
+        '*ERROR collecting test_cycle.yml*',
+        '*Include cycle*',
+    ])
+
+
+def test_check_includes_disabled(testdir):
+    _write(testdir.tmpdir, 'test_missing.yml', ['missing.yml'])
+
+    result = testdir.runpytest('--collect-only')
+
+    assert result.ret == 0
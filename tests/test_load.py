@@ -0,0 +1,226 @@
+import pytest
+
+
+@pytest.mark.parametrize('spec,expected', [
+    ('users=10,duration=60s,ramp=10s', (10, 60, 10, None, 1)),
+    ('users=2,iterations=3', (2, None, 0, 3, 1)),
+    ('duration=1m', (1, 60, 0, None, 1)),
+    ('users=1,duration=500ms', (1, 0.5, 0, None, 1)),
+    ('users=4', (4, None, 0, 1, 1)),
+    ('users=4,processes=2', (4, None, 0, 1, 2)),
+])
+def test_parse_load_spec(spec, expected):
+    from pytest_play.load import parse_load_spec
+    assert tuple(parse_load_spec(spec)) == expected
+
+
+@pytest.mark.parametrize('spec', [
+    'users',
+    'users=0',
+    'processes=0',
+    'foo=1',
+    'duration=abc',
+])
+def test_parse_load_spec_invalid(spec):
+    from pytest_play.load import parse_load_spec
+    with pytest.raises(ValueError):
+        parse_load_spec(spec)
+
+
+def test_parse_load_spec_no_fork():
+    import mock
+    from pytest_play.load import parse_load_spec
+    with mock.patch(
+            'multiprocessing.get_all_start_methods',
+            return_value=['spawn']):
+        assert parse_load_spec('users=2').processes == 1
+        with pytest.raises(ValueError):
+            parse_load_spec('users=2,processes=2')
+
+
+def test_load_processes_no_fork(testdir):
+    testdir.makeconftest("""
+import multiprocessing
+
+
+def pytest_cmdline_main(config):
+    multiprocessing.get_all_start_methods = lambda: ['spawn']
+    """)
+    result = testdir.runpytest_subprocess(
+        '--play-load', 'users=2,processes=2')
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(['*Invalid --play-load option*fork*'])
+
+
+def test_load_stats():
+    from pytest_play.load import LoadStats
+    stats = LoadStats()
+    stats.start_time = 0
+    stats.end_time = 10
+    for value in range(1, 101):
+        stats.record('cmd', value / 1000.)
+    stats.record('cmd', 0.2, error=True)
+    row = stats.summary()[0]
+    assert row['count'] == 101
+    assert row['errors'] == 1
+    assert row['throughput'] == 10.1
+    assert row['p50'] == pytest.approx(0.051, rel=0.01)
+    assert row['p99'] == pytest.approx(0.1, rel=0.01)
+    assert row['max'] == 0.2
+
+
+def test_load(testdir):
+    testdir.makefile(".yml", """
+---
+test_data:
+  - mydata: 1
+  - mydata: 2
+---
+- provider: python
+  type: assert
+  expression: "variables['mydata'] < 3"
+- provider: python
+  type: store_variable
+  name: mydata
+  expression: "variables['mydata'] + 10"
+    """)
+
+    result = testdir.runpytest('--play-load', 'users=3,iterations=2')
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        '*pytest-play load*',
+        'users: 3, iterations: 6, *errors: 0',
+        '*test_load.yml #0 python.assert*12*',
+        '*test_load.yml #1 python.store_variable*12*',
+    ])
+
+
+def test_load_processes(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: store_variable
+  name: pid
+  expression: "1"
+- provider: python
+  type: sleep
+  seconds: 0.01
+    """)
+
+    result = testdir.runpytest_subprocess(
+        '--play-load', 'users=5,iterations=2,processes=2')
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        'users: 5, iterations: 10, *errors: 0',
+        '*test_load_processes.yml #0 python.store_variable*10*',
+        '*test_load_processes.yml #1 python.sleep*10*',
+    ])
+
+
+def test_load_skipped(testdir):
+    testdir.makefile(".yml", test_skipped="""
+---
+markers:
+  - skip
+---
+- provider: python
+  type: assert
+  expression: "0"
+    """, test_xfail="""
+---
+markers:
+  - xfail
+---
+- provider: python
+  type: assert
+  expression: "0"
+    """, test_run="""
+---
+- provider: python
+  type: assert
+  expression: "1"
+    """)
+
+    result = testdir.runpytest('--play-load', 'users=2,iterations=2')
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines([
+        'users: 2, iterations: 4, *errors: 0',
+        '*test_run.yml #0 python.assert*',
+    ])
+    assert 'test_skipped.yml' not in result.stdout.str()
+    assert 'test_xfail.yml' not in result.stdout.str()
+
+
+def test_load_quiet(testdir):
+    testdir.makeconftest("""
+def pytest_sessionfinish(session):
+    print('user_properties: {0}'.format(
+        sum(len(item.user_properties) for item in session.items)))
+    """)
+    testdir.makefile(".yml", """
+---
+- provider: metrics
+  type: record_property
+  name: answer
+  expression: "42"
+    """)
+
+    result = testdir.runpytest('-s', '--play-load', 'users=2,iterations=3')
+
+    assert result.ret == 0
+    result.stdout.fnmatch_lines(['user_properties: 0'])
+    result.stdout.fnmatch_lines(['users: 2, iterations: 6, *errors: 0'])
+    assert "'_elapsed'" not in result.stdout.str()
+
+    result = testdir.runpytest(
+        '-s', '--play-load', 'users=2,iterations=3',
+        '--play-timing-sink', 'print')
+    assert result.ret == 0
+    assert result.stdout.str().count("'_elapsed'") == 6
+
+
+def test_load_stats_merge():
+    from pytest_play.load import LoadStats
+    stats = LoadStats()
+    stats.record('cmd', 0.1)
+    other = LoadStats()
+    other.record('cmd', 0.2, error=True)
+    other.record('other', 0.3)
+    other.record_iteration()
+    stats.merge(other.export())
+    stats.start_time = stats.end_time = 0
+    summary = dict((row['name'], row) for row in stats.summary())
+    assert summary['cmd']['count'] == 2
+    assert summary['cmd']['max'] == 0.2
+    assert summary['other']['count'] == 1
+    assert stats.errors == {'cmd': 1}
+    assert stats.iterations == 1
+
+
+def test_load_errors(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "0"
+- provider: python
+  type: assert
+  expression: "1"
+    """)
+
+    result = testdir.runpytest('--play-load', 'users=2,duration=0.3s')
+
+    assert result.ret != 0
+    result.stdout.fnmatch_lines([
+        '*test_load_errors.yml #0 python.assert*',
+    ])
+    assert 'test_load_errors.yml #1' not in result.stdout.str()
+
+
+def test_load_invalid(testdir):
+    result = testdir.runpytest('--play-load', 'users=foo')
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(['*Invalid --play-load option*'])
@@ -89,17 +89,15 @@ def test_record_property():
     provider._record_property = mock_record_property
     provider._record_property_statsd = mock_record_property_statsd
     assert provider.engine is mock_engine
-    mock_engine.execute_command.return_value = elapsed*1000
+    mock_engine.evaluate.return_value = elapsed*1000
     provider.command_record_property({
         'provider': 'metrics',
         'type': 'record_property',
         'name': 'elapsed_milliseconds',
         'expression': 'variables["_elapsed"]*1000',
     })
-    assert mock_engine.execute_command.assert_called_once_with(
-        {'provider': 'python',
-         'type': 'exec',
-         'expression': 'variables["_elapsed"]*1000'}) is None
+    assert mock_engine.evaluate.assert_called_once_with(
+        'variables["_elapsed"]*1000') is None
     assert mock_engine \
         .update_variables \
         .assert_called_once_with(
@@ -123,7 +121,7 @@ def test_record_property_string_no_statsd():
     provider._record_property = mock_record_property
     provider._record_property_statsd = mock_record_property_statsd
     assert provider.engine is mock_engine
-    mock_engine.execute_command.return_value = "a string"
+    mock_engine.evaluate.return_value = "a string"
     with mock.patch(
             'pytest_play.providers.metrics.MetricsProvider.statsd_client',
             new_callable=mock.PropertyMock) as statsd_client:
@@ -133,10 +131,8 @@ def test_record_property_string_no_statsd():
             'name': 'elapsed_milliseconds',
             'expression': '"a string"',
         })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': '"a string"'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            '"a string"') is None
         assert mock_engine \
             .update_variables \
             .assert_called_once_with(
@@ -160,17 +156,15 @@ def test_record_property_statsd_no_metric_type():
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        mock_engine.execute_command.return_value = elapsed*1000
+        mock_engine.evaluate.return_value = elapsed*1000
         provider.command_record_property({
             'provider': 'metrics',
             'type': 'record_property',
             'name': 'elapsed_milliseconds',
             'expression': 'variables["_elapsed"]*1000',
         })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': 'variables["_elapsed"]*1000'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            'variables["_elapsed"]*1000') is None
         assert mock_engine \
             .update_variables \
             .assert_called_once_with(
@@ -194,7 +188,7 @@ def test_record_property_statsd_metric_type_timing():
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        mock_engine.execute_command.return_value = elapsed*1000
+        mock_engine.evaluate.return_value = elapsed*1000
         provider.command_record_property({
             'provider': 'metrics',
             'type': 'record_property',
@@ -202,10 +196,8 @@ def test_record_property_statsd_metric_type_timing():
             'expression': 'variables["_elapsed"]*1000',
             'metric_type': 'timing',
         })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': 'variables["_elapsed"]*1000'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            'variables["_elapsed"]*1000') is None
         assert mock_engine \
             .update_variables \
             .assert_called_once_with(
@@ -230,7 +222,7 @@ def test_record_property_statsd_metric_type_negative(metric_type):
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        mock_engine.execute_command.return_value = "a string"
+        mock_engine.evaluate.return_value = "a string"
         with pytest.raises(ValueError):
             provider.command_record_property({
                 'provider': 'metrics',
@@ -239,10 +231,8 @@ def test_record_property_statsd_metric_type_negative(metric_type):
                 'expression': '"a string"',
                 'metric_type': metric_type,
             })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': '"a string"'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            '"a string"') is None
         assert mock_engine \
             .update_variables \
             .called is False
@@ -264,7 +254,7 @@ def test_record_property_statsd_metric_type_negative_invalid(metric_type):
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        mock_engine.execute_command.return_value = "1"
+        mock_engine.evaluate.return_value = "1"
         with pytest.raises(ValueError):
             provider.command_record_property({
                 'provider': 'metrics',
@@ -273,10 +263,8 @@ def test_record_property_statsd_metric_type_negative_invalid(metric_type):
                 'expression': '"1"',
                 'metric_type': metric_type,
             })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': '"1"'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            '"1"') is None
         assert mock_engine \
             .update_variables \
             .called is False
@@ -299,7 +287,7 @@ def test_record_property_statsd_metric_type_gauge():
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        mock_engine.execute_command.return_value = elapsed*1000
+        mock_engine.evaluate.return_value = elapsed*1000
         provider.command_record_property({
             'provider': 'metrics',
             'type': 'record_property',
@@ -307,10 +295,8 @@ def test_record_property_statsd_metric_type_gauge():
             'expression': 'variables["_elapsed"]*1000',
             'metric_type': 'gauge',
         })
-        assert mock_engine.execute_command.assert_called_once_with(
-            {'provider': 'python',
-             'type': 'exec',
-             'expression': 'variables["_elapsed"]*1000'}) is None
+        assert mock_engine.evaluate.assert_called_once_with(
+            'variables["_elapsed"]*1000') is None
         assert mock_engine \
             .update_variables \
             .assert_called_once_with(
@@ -330,9 +316,10 @@ def test_record_elapsed_start():
     from pytest_play import providers
     provider = providers.MetricsProvider(mock_engine)
     assert provider.engine is mock_engine
-    time_start = 1550770816.1716287
-    with mock.patch('pytest_play.providers.metrics.time') as time:
-        time.time.return_value = time_start
+    time_start = 1550770816171628700
+    with mock.patch(
+            'pytest_play.providers.metrics.perf_counter_ns',
+            return_value=time_start):
         provider.command_record_elapsed_start({
             'provider': 'metrics',
             'type': 'record_elapsed_start',
@@ -345,7 +332,7 @@ def test_record_elapsed_start():
 def test_record_elapsed_stop():
     import mock
     mock_engine = mock.MagicMock()
-    time_start = 1550770816.1716287
+    time_start = 1550770816171628700
     mock_engine.variables = {'async_update': time_start}
     mock_record_property = mock.MagicMock()
     mock_record_property_statsd = mock.MagicMock()
@@ -354,22 +341,23 @@ def test_record_elapsed_stop():
     provider._record_property = mock_record_property
     provider._record_property_statsd = mock_record_property_statsd
     assert provider.engine is mock_engine
-    time_stop = 1550770817.1716287
-    with mock.patch('pytest_play.providers.metrics.time') as time:
-        time.time.return_value = time_stop
+    time_stop = 1550770817171628700
+    with mock.patch(
+            'pytest_play.providers.metrics.perf_counter_ns',
+            return_value=time_stop):
         provider.command_record_elapsed_stop({
             'provider': 'metrics',
             'type': 'record_elapsed_stop',
             'name': 'async_update',
         })
     assert mock_engine.update_variables.assert_called_once_with(
-        {'async_update': time_stop-time_start}) is None
+        {'async_update': 1.0, 'async_update_ns': 1000000000}) is None
 
 
 def test_record_elapsed_stop_statsd():
     import mock
     mock_engine = mock.MagicMock()
-    time_start = 1550770816.1716287
+    time_start = 1550770816171628700
     mock_engine.variables = {'async_update': time_start}
     mock_record_property = mock.MagicMock()
     from pytest_play import providers
@@ -379,16 +367,17 @@ def test_record_elapsed_stop_statsd():
         provider = providers.MetricsProvider(mock_engine)
         provider._record_property = mock_record_property
         assert provider.engine is mock_engine
-        time_stop = 1550770817.1716287
-        with mock.patch('pytest_play.providers.metrics.time') as time:
-            time.time.return_value = time_stop
+        time_stop = 1550770817171628700
+        with mock.patch(
+                'pytest_play.providers.metrics.perf_counter_ns',
+                return_value=time_stop):
             provider.command_record_elapsed_stop({
                 'provider': 'metrics',
                 'type': 'record_elapsed_stop',
                 'name': 'async_update',
             })
         assert statsd_client.return_value.timing.assert_called_once_with(
-            'async_update', (time_stop-time_start)*1000) is None
+            'async_update', 1000.) is None
 
 
 def test_record_elapsed_stop_key_error():
@@ -404,3 +393,32 @@ def test_record_elapsed_stop_key_error():
             'type': 'record_elapsed_stop',
             'name': 'async_update',
         })
+
+
+def test_record_property_histograms():
+    import mock
+    from pytest_play.histogram import Histograms
+    mock_engine = mock.MagicMock()
+    mock_engine.request.config._play_histograms = Histograms()
+    from pytest_play import providers
+    provider = providers.MetricsProvider(mock_engine)
+    provider.record_property('elapsed', 0.5)
+    provider.record_property('elapsed', 1.5)
+    provider.record_property('flag', True)
+    provider.record_property('label', 'a string')
+    summary = mock_engine.request.config._play_histograms.summary()
+    assert len(summary) == 1
+    assert summary[0]['name'] == 'elapsed'
+    assert summary[0]['count'] == 2
+    assert summary[0]['max'] == 1.5
+
+
+def test_record_property_no_histograms():
+    import mock
+    mock_engine = mock.MagicMock()
+    mock_engine.request.config._play_histograms = None
+    mock_engine.request.config._play_load = None
+    from pytest_play import providers
+    provider = providers.MetricsProvider(mock_engine)
+    provider.record_property('elapsed', 0.5)
+    assert provider._record_property.called
@@ -0,0 +1,104 @@
+import pytest
+
+
+@pytest.mark.parametrize('command', [
+    {'provider': 'python', 'type': 'assert', 'expression': '1 == 1'},
+    {'provider': 'python', 'type': 'assert',
+     'expression': "'$foo' == 'bar'"},
+    {'provider': 'python', 'type': 'sleep', 'seconds': '$sleep_time'},
+    {'provider': 'python', 'type': 'sleep', 'seconds': '0.5'},
+    {'provider': 'python', 'type': 'assert',
+     'expression': '{! variables["foo"].upper() !} == "BAR"'},
+    {'provider': 'python', 'type': 'while', 'expression': 'True',
+     'sub_commands': [
+         {'provider': 'python', 'type': 'store_variable',
+          'name': '$foo', 'expression': '$count'}]},
+    {'provider': 'python', 'type': 'assert', 'expression': '$missing'},
+    {'provider': 'python', 'type': 'assert', 'expression': '$flag'},
+    {'provider': 'python', 'type': 'assert', 'expression': '$$foo'},
+])
+def test_render_equivalence(play, command):
+    play.variables.update(
+        {'foo': 'bar', 'sleep_time': 0.5, 'count': 3, 'flag': 'true'})
+    play.compile_commands = False
+    expected = play.render_command(command)
+    play.compile_commands = True
+    assert play.render_command(command) == expected
+
+
+def test_render_fresh_copy(play):
+    command = {'provider': 'python', 'type': 'while',
+               'sub_commands': [{'comment': 'static'}]}
+    rendered = play.render_command(command)
+    assert rendered == command
+    rendered['sub_commands'][0]['comment'] = 'changed'
+    assert command['sub_commands'][0]['comment'] == 'static'
+    assert play.render_command(command) == command
+
+
+def test_render_variables_update(play):
+    command = {'provider': 'python', 'type': 'assert',
+               'expression': '$count'}
+    play.variables['count'] = 1
+    assert play.render_command(command)['expression'] == 1
+    play.variables['count'] = 2
+    assert play.render_command(command)['expression'] == 2
+
+
+@pytest.mark.parametrize('source, value, expected', [
+    ('$a', '5', 5),
+    ('$a', '0.5', 0.5),
+    ('$a', 'true', True),
+    ('$a', '~', None),
+    ('$a', '[1, 2]', [1, 2]),
+    ('$a', '{"k": 1}', {'k': 1}),
+    ('$a', 'bar', 'bar'),
+    ('$a', 'foo: bar', 'foo: bar'),
+    ('$a', 'foo #bar', 'foo #bar'),
+    ('$a', '- foo', '- foo'),
+    ('$a', '[1, 2', '[1, 2'),
+    ('pre $a', '{"k": 1}', 'pre {"k": 1}'),
+    ('pre $a', '1', 'pre 1'),
+])
+def test_render_placeholder_retype(source, value, expected):
+    from pytest_play.plan import PlaceholderNode
+    assert PlaceholderNode(source).render({'a': value}, {}) == expected
+
+
+def test_render_placeholder_invalid_flow():
+    import yaml
+    from pytest_play.plan import PlaceholderNode
+    with pytest.raises(yaml.YAMLError):
+        PlaceholderNode('$a').render({'a': '[1, 2]]'}, {})
+    with pytest.raises(yaml.YAMLError):
+        PlaceholderNode('$a').render({'a': '{a: b} {c}'}, {})
+
+
+def test_compile_plan_static_leaves():
+    from pytest_play.plan import (
+        compile_plan,
+        PlaceholderNode,
+        StaticNode,
+    )
+    plan = compile_plan({'type': 'assert', 'expression': '$foo'})
+    nodes = dict((key.value, value) for key, value in plan.items)
+    assert isinstance(nodes['type'], StaticNode)
+    assert isinstance(nodes['expression'], PlaceholderNode)
+
+
+def test_plan_cache():
+    from pytest_play.plan import PlanCache
+    cache = PlanCache()
+    command = {'type': 'assert'}
+    assert cache.get(command) is None
+    plan = cache.add(command)
+    assert cache.add(command) is plan
+    assert cache.get(command) is plan
+    assert cache.get({'type': 'assert'}) is None
+    cache.add({'type': 'exec'})
+    assert len(cache) == 2
+    cache.discard(command)
+    assert cache.get(command) is None
+    assert len(cache) == 1
+    cache.clear()
+    assert len(cache) == 0
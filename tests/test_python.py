@@ -461,3 +461,260 @@ def test_parametrization_template_string_2(play):
   seconds: "0.1"
   comment: a default comment
         """)
+
+
+def test_expression_cache(play):
+    from pytest_play.expressions import compile_expression
+    play.variables = {'foo': 'baz'}
+    expression = 'variables["foo"] == "baz" and 12345 > 0'
+    compile_expression.cache_clear()
+    for i in range(3):
+        play.execute_command({
+            'provider': 'python',
+            'type': 'assert',
+            'expression': expression})
+    cache_info = compile_expression.cache_info()
+    assert cache_info.misses == 1
+    assert cache_info.hits == 2
+    assert compile_expression(expression) is compile_expression(expression)
+
+
+def test_expression_cache_syntax_error(play):
+    from pytest_play.expressions import compile_expression
+    compile_expression.cache_clear()
+    for i in range(2):
+        with pytest.raises(SyntaxError):
+            compile_expression('import os')
+    assert compile_expression.cache_info().currsize == 0
+
+
+def test_assertion_kwargs_no_leak(play):
+    play.variables = {'foo': 'baz'}
+    from pytest_play import providers
+    provider = providers.PythonProvider(play)
+    provider.command_assert({
+        'provider': 'python',
+        'type': 'assert',
+        'expression': 'variable == 200'
+        },
+        variable=200)
+    assert 'variable' not in play.context
+    assert 'variable' not in play._context
+    with pytest.raises(Exception):
+        provider.command_exec({
+            'provider': 'python',
+            'type': 'exec',
+            'expression': 'variable'})
+
+
+def test_context_layers(play):
+    play.variables = {'foo': 'baz'}
+    context = play.namespace(foo='local')
+    assert context['foo'] == 'local'
+    assert context['variables'] is play.variables
+    assert context['len'] is len
+    assert 'variables' not in play._context
+
+
+def test_parallel(play):
+    import time
+    play.variables = {'foo': 'baz'}
+    start_time = time.time()
+    play.execute_command({
+        'provider': 'python',
+        'type': 'parallel',
+        'blocks': [[
+            {'provider': 'python', 'type': 'sleep', 'seconds': 0.3},
+            {'provider': 'python', 'type': 'store_variable',
+             'name': 'first', 'expression': '1'},
+            {'provider': 'python', 'type': 'store_variable',
+             'name': 'conflict', 'expression': '"first"'},
+        ], [
+            {'provider': 'python', 'type': 'sleep', 'seconds': 0.3},
+            {'provider': 'python', 'type': 'store_variable',
+             'name': 'second', 'expression': 'variables["foo"]'},
+        ], [
+            {'provider': 'python', 'type': 'store_variable',
+             'name': 'conflict', 'expression': '"third"'},
+        ]]
+    })
+    assert time.time() - start_time < 0.6
+    assert play.variables['first'] == 1
+    assert play.variables['second'] == 'baz'
+    assert play.variables['conflict'] == 'third'
+    assert play.variables['foo'] == 'baz'
+
+
+def test_parallel_fail_fast(play):
+    play.variables = {}
+    with pytest.raises(AssertionError):
+        play.execute_command({
+            'provider': 'python',
+            'type': 'parallel',
+            'max_workers': 2,
+            'blocks': [[
+                {'provider': 'python', 'type': 'assert',
+                 'expression': 'False'},
+            ], [
+                {'provider': 'python', 'type': 'sleep', 'seconds': 0.3},
+                {'provider': 'python', 'type': 'store_variable',
+                 'name': 'second', 'expression': '1'},
+            ]]
+        })
+    assert 'second' not in play.variables
+
+
+def test_parallel_no_blocks(play):
+    play.variables = {}
+    play.execute_command({
+        'provider': 'python',
+        'type': 'parallel',
+    })
+
+
+def test_wait_until_backoff(play):
+    from pytest_play.providers.python import TimeoutException
+    play.variables = {'attempts': 0}
+    with pytest.raises(TimeoutException):
+        play.execute_command({
+            'provider': 'python',
+            'type': 'wait_until',
+            'expression': 'False',
+            'timeout': 0.7,
+            'poll': 0.1,
+            'backoff': 2,
+            'sub_commands': [{
+                'provider': 'python',
+                'type': 'store_variable',
+                'name': 'attempts',
+                'expression': 'variables["attempts"] + 1'
+            }]
+        })
+    # 0, 0.1, 0.3 and a final attempt at the deadline
+    assert play.variables['attempts'] == 4
+
+
+def test_wait_until_wake(play):
+    import threading
+    import time
+    play.variables = {'ready': False}
+
+    def ready():
+        play.variables['ready'] = True
+        play.wake()
+
+    timer = threading.Timer(0.1, ready)
+    timer.start()
+    start_time = time.time()
+    play.execute_command({
+        'provider': 'python',
+        'type': 'wait_until',
+        'expression': 'variables["ready"]',
+        'timeout': 10,
+        'poll': 5,
+    })
+    assert time.time() - start_time < 2
+    timer.join()
+    # forked engines share the wake signal
+    assert play.fork({}).wake_signal is play.wake_signal
+
+
+def test_while_condition_false_at_deadline(play):
+    play.variables = {'countdown': 1}
+    play.execute_command({
+        'provider': 'python',
+        'type': 'while',
+        'expression': 'variables["countdown"] > 0',
+        'timeout': 0.1,
+        'poll': 0.05,
+        'sub_commands': [{
+            'provider': 'python',
+            'type': 'sleep',
+            'seconds': 0.2}, {
+            'provider': 'python',
+            'type': 'store_variable',
+            'name': 'countdown',
+            'expression': 'variables["countdown"] - 1'
+        }]
+    })
+    assert play.variables['countdown'] == 0
+    assert play.variables['_loop_iterations'] == 1
+
+
+def test_wait_until_immediate_loop_variables(play):
+    play.variables = {}
+    play.execute_command({
+        'provider': 'python',
+        'type': 'wait_until',
+        'expression': 'True',
+        'poll': 0.1,
+    })
+    assert play.variables['_loop_iterations'] == 1
+    assert play.variables['_loop_waited'] == 0
+    assert play.variables['_loop_last_elapsed'] == \
+        play.variables['_loop_max_elapsed']
+
+
+def test_wait_until_not_loop_variables(play):
+    play.variables = {'countdown': 3}
+    play.execute_command({
+        'provider': 'python',
+        'type': 'wait_until_not',
+        'expression': 'variables["countdown"] > 0',
+        'poll': 0.05,
+        'sub_commands': [{
+            'provider': 'python',
+            'type': 'store_variable',
+            'name': 'countdown',
+            'expression': 'variables["countdown"] - 1'
+        }]
+    })
+    assert play.variables['_loop_iterations'] == 3
+    assert play.variables['_loop_waited'] >= 0.1
+    assert 0 <= play.variables['_loop_last_elapsed'] <= \
+        play.variables['_loop_max_elapsed']
+
+
+def test_while_timeout_loop_variables(play):
+    from pytest_play.providers.python import TimeoutException
+    play.variables = {}
+    with pytest.raises(TimeoutException):
+        play.execute_command({
+            'provider': 'python',
+            'type': 'while',
+            'expression': 'True',
+            'timeout': 0.3,
+            'poll': 0.1,
+        })
+    assert play.variables['_loop_iterations'] >= 3
+    assert play.variables['_loop_waited'] == pytest.approx(0.3, abs=0.1)
+    assert play.variables['_loop_max_elapsed'] >= \
+        play.variables['_loop_last_elapsed']
+
+
+def test_loop_sub_commands_compiled_once(play):
+    import mock
+    from pytest_play import plan
+
+    def run(countdown):
+        play.variables = {'countdown': countdown}
+        with mock.patch.object(
+                plan, 'compile_plan', wraps=plan.compile_plan) as compile:
+            play.execute_command({
+                'provider': 'python',
+                'type': 'wait_until_not',
+                'expression': 'variables["countdown"] > 0',
+                'poll': 0,
+                'sub_commands': [{
+                    'provider': 'python',
+                    'type': 'store_variable',
+                    'name': 'countdown',
+                    'expression': 'variables["countdown"] - 1'
+                }]
+            })
+        assert play.variables['_loop_iterations'] == countdown
+        return compile.call_count
+
+    assert run(1) == run(5)
+    # local plans are dropped
+    assert len(play._plans) == 0
@@ -0,0 +1,255 @@
+import os
+import pytest
+
+
+def test_scenario_cache_get(tmpdir):
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("""
+markers:
+  - foo
+---
+- provider: python
+  type: assert
+  expression: "1"
+""")
+    scenario = cache.get(yml_file.strpath)
+    assert scenario.documents[0] == {'markers': ['foo']}
+    assert scenario.documents[-1][0]['expression'] == '1'
+    assert cache.misses == 1
+    assert cache.get(yml_file.strpath) is scenario
+    assert cache.hits == 1
+
+
+def test_scenario_cache_get_modified(tmpdir):
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("""
+- provider: python
+  type: assert
+  expression: "1"
+""")
+    scenario = cache.get(yml_file.strpath)
+    yml_file.write("""
+- provider: python
+  type: assert
+  expression: "2"
+""")
+    stat = os.stat(yml_file.strpath)
+    os.utime(yml_file.strpath, ns=(stat.st_atime_ns,
+                                   stat.st_mtime_ns + 1000000000))
+    modified = cache.get(yml_file.strpath)
+    assert modified is not scenario
+    assert modified.documents[-1][0]['expression'] == '2'
+    assert cache.misses == 2
+
+
+def test_scenario_cache_get_touched(tmpdir):
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("- provider: python\n")
+    scenario = cache.get(yml_file.strpath)
+    stat = os.stat(yml_file.strpath)
+    os.utime(yml_file.strpath, ns=(stat.st_atime_ns,
+                                   stat.st_mtime_ns + 1000000000))
+    assert cache.get(yml_file.strpath) is scenario
+    assert cache.misses == 1
+
+
+def test_scenario_cache_parse():
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache(maxsize=1)
+    scenario = cache.parse("- provider: python\n")
+    assert cache.parse("- provider: python\n") is scenario
+    cache.parse("- provider: include\n")
+    assert cache.parse("- provider: python\n") is not scenario
+    cache.clear()
+    assert cache.hits == cache.misses == 0
+
+
+def test_scenario_cache_plans():
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache(maxsize=1)
+    scenario = cache.parse("- provider: python\n  type: $type\n")
+    step = scenario.documents[-1][0]
+    assert len(scenario.plans) == 0
+    plan = cache.get_plan(step)
+    assert cache.get_plan(step) is plan
+    assert len(scenario.plans) == 1
+    assert plan.render({'type': 'assert'}, {}) == {
+        'provider': 'python', 'type': 'assert'}
+    assert cache.get_plan({'provider': 'python', 'type': '$type'}) is None
+    # evicted
+    cache.parse("- provider: include\n")
+    assert cache.get_plan(step) is None
+    assert cache.get_plan(cache.parse("{}").documents[-1]) is None
+
+
+def test_scenario_cache_test_data(testdir):
+    testdir.makeconftest("""
+def pytest_sessionfinish(session):
+    from pytest_play.scenarios import scenario_cache
+    assert scenario_cache.misses == 1
+""")
+    testdir.makefile(".yml", """
+---
+test_data:
+  - mydata: 1
+  - mydata: 2
+  - mydata: 3
+---
+- provider: python
+  type: assert
+  expression: "variables['mydata'] < 4"
+    """)
+
+    result = testdir.runpytest_subprocess()
+
+    result.assert_outcomes(passed=3)
+
+
+@pytest.mark.parametrize('text,expected', [
+    ('', None),
+    ('- provider: python\n', None),
+    ('---\n- provider: python\n', None),
+    ('markers:\n  - foo\n', None),
+    ('markers:\n  - foo\n---\n- provider: python\n', {'markers': ['foo']}),
+    ('---\nmarkers: [foo]\n---\n- provider: python\n', {'markers': ['foo']}),
+    ('---\n---\n- provider: python\n', None),
+])
+def test_load_metadata(text, expected):
+    from pytest_play.scenarios import load_metadata
+    assert load_metadata(text) == expected
+
+
+def test_load_metadata_steps_not_parsed():
+    from pytest_play.scenarios import load_metadata
+    assert load_metadata(
+        'markers: [foo]\n---\n- provider: [python\n') == {'markers': ['foo']}
+    assert load_metadata('- provider: [python\n') is None
+
+
+def test_scenario_cache_get_metadata(tmpdir):
+    from pytest_play.scenarios import ScenarioCache
+    cache = ScenarioCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("""
+markers:
+  - foo
+---
+- provider: python
+  type: assert
+  expression: "1"
+""")
+    assert cache.get_metadata(yml_file.strpath) == {'markers': ['foo']}
+    assert cache.misses == 0
+    cache.get(yml_file.strpath)
+    assert cache.misses == 1
+    cache.clear()
+    cache.get(yml_file.strpath)
+    assert cache.get_metadata(yml_file.strpath) == {'markers': ['foo']}
+
+
+class DummyCache(object):
+
+    def __init__(self):
+        self.values = {}
+
+    def get(self, key, default):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+
+
+def test_collection_cache(tmpdir):
+    import mock
+    from pytest_play.scenarios import CollectionCache
+    cache = DummyCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("""
+markers:
+  - foo
+---
+- provider: python
+""")
+    collection_cache = CollectionCache(cache)
+    assert collection_cache.get_metadata(yml_file.strpath) == {
+        'markers': ['foo']}
+    collection_cache.save()
+    assert not collection_cache.dirty
+    assert yml_file.strpath in cache.get(CollectionCache.key, {})
+
+    with mock.patch('pytest_play.scenarios.load_metadata') as load_metadata:
+        collection_cache = CollectionCache(cache)
+        assert collection_cache.get_metadata(yml_file.strpath) == {
+            'markers': ['foo']}
+        # touched but unchanged
+        stat = os.stat(yml_file.strpath)
+        os.utime(yml_file.strpath, ns=(stat.st_atime_ns,
+                                       stat.st_mtime_ns + 1000000000))
+        assert collection_cache.get_metadata(yml_file.strpath) == {
+            'markers': ['foo']}
+        assert collection_cache.dirty
+        assert not load_metadata.called
+
+
+def test_collection_cache_changed(tmpdir):
+    from pytest_play.scenarios import CollectionCache
+    cache = DummyCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write("markers: [foo]\n---\n- provider: python\n")
+    CollectionCache(cache).get_metadata(yml_file.strpath)
+    yml_file.write("markers: [bar]\n---\n- provider: python\n")
+    assert CollectionCache(cache).get_metadata(yml_file.strpath) == {
+        'markers': ['bar']}
+
+
+def test_collection_cache_not_serializable(tmpdir):
+    from pytest_play.scenarios import CollectionCache
+    cache = DummyCache()
+    yml_file = tmpdir.join('test_scenario.yml')
+    yml_file.write(
+        "test_data:\n  - day: 2019-06-12\n---\n- provider: python\n")
+    collection_cache = CollectionCache(cache)
+    metadata = collection_cache.get_metadata(yml_file.strpath)
+    assert metadata['test_data'][0]['day'].year == 2019
+    assert yml_file.strpath not in collection_cache.entries
+
+
+def test_collection_cache_sessions(testdir, monkeypatch):
+    testdir.makeconftest("""
+import os
+import pytest_play.scenarios
+
+
+def pytest_configure(config):
+    if os.environ.get('PLAY_FORBID_PARSE'):
+        def load_metadata(stream):
+            raise AssertionError('parsed')
+        pytest_play.scenarios.load_metadata = load_metadata
+""")
+    testdir.makefile(".yml", """
+---
+markers:
+  - foo
+test_data:
+  - mydata: 1
+  - mydata: 2
+---
+- provider: python
+  type: assert
+  expression: "variables['mydata'] < 3"
+    """)
+
+    result = testdir.runpytest_subprocess('-m', 'foo')
+    result.assert_outcomes(passed=2)
+
+    monkeypatch.setenv('PLAY_FORBID_PARSE', '1')
+    result = testdir.runpytest_subprocess('-m', 'foo')
+    result.assert_outcomes(passed=2)
+    result = testdir.runpytest_subprocess('-m', 'foo', '--cache-clear')
+    assert result.ret != 0
@@ -32,3 +32,148 @@ def test_statsd_cli(request):
         stats_host='http://', stats_port='80',
         stats_prefix='prefix')
     assert result.ret == 0
+
+
+def _config(**options):
+    import mock
+    config = mock.Mock(spec=['getoption'])
+    defaults = {
+        'stats_host': 'localhost',
+        'stats_port': 8125,
+        'stats_prefix': None,
+        'stats_batch_size': 0,
+        'stats_flush_interval': None,
+    }
+    defaults.update(options)
+    config.getoption.side_effect = lambda name, default=None: \
+        defaults.get(name, default)
+    return config
+
+
+def test_statsd_client_cached():
+    import mock
+    from pytest_play.stats import (
+        get_statsd_client,
+        close_statsd_client,
+    )
+    config = _config()
+    with mock.patch('statsd.StatsClient') as client_class:
+        client = get_statsd_client(config)
+        assert get_statsd_client(config) is client
+        assert client_class.call_count == 1
+        client_class.assert_called_once_with(
+            'localhost', 8125, prefix=None)
+        close_statsd_client(config)
+        assert client.close.called
+        get_statsd_client(config)
+        assert client_class.call_count == 2
+
+
+def test_statsd_client_batch_size():
+    import mock
+    from pytest_play.stats import (
+        BufferedStatsClient,
+        get_statsd_client,
+    )
+    config = _config(stats_batch_size=3)
+    with mock.patch('statsd.StatsClient') as client_class:
+        client = get_statsd_client(config)
+    assert isinstance(client, BufferedStatsClient)
+    assert client.client is client_class.return_value
+    pipeline = client_class.return_value.pipeline.return_value
+    client.timing('a', 1)
+    client.gauge('b', 2)
+    assert pipeline.timing.called
+    assert pipeline.gauge.called
+    assert not pipeline.send.called
+    client.timing('c', 3)
+    assert pipeline.send.call_count == 1
+    client.timing('d', 4)
+    client.close()
+    assert pipeline.send.call_count == 2
+    assert client_class.return_value.close.called
+
+
+def test_statsd_client_flush_interval():
+    import mock
+    from pytest_play.stats import BufferedStatsClient
+    client = BufferedStatsClient(mock.MagicMock(), 100, flush_interval=0)
+    client.timing('a', 1)
+    assert client.client.pipeline.return_value.send.call_count == 1
+
+
+def test_statsd_client_flush_timer():
+    import time
+    import mock
+    from pytest_play.stats import BufferedStatsClient
+    client = BufferedStatsClient(mock.MagicMock(), 100, flush_interval=0.05)
+    send = client.client.pipeline.return_value.send
+    try:
+        client.timing('a', 1)
+        assert send.call_count == 0
+        deadline = time.monotonic() + 5
+        while not send.called and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert send.call_count == 1
+    finally:
+        client.close()
+    assert not client._flusher.is_alive()
+
+
+def test_statsd_batched_load_processes(testdir):
+    import socket
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    testdir.makefile(".yml", """
+---
+- provider: metrics
+  type: record_property
+  name: answer
+  expression: "42"
+  metric_type: gauge
+    """)
+    try:
+        result = testdir.runpytest_subprocess(
+            '--stats-d', '--stats-host', '127.0.0.1',
+            '--stats-port', str(server.getsockname()[1]),
+            '--stats-batch-size', '1000',
+            '--play-load', 'users=2,iterations=5,processes=2')
+        assert result.ret == 0
+        metrics = []
+        while len(metrics) < 10:
+            metrics.extend(
+                server.recv(4096).decode('ascii').splitlines())
+    finally:
+        server.close()
+    assert metrics == ['answer:42|g'] * 10
+
+
+def test_statsd_batched_session(testdir):
+    import socket
+    server = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    server.bind(('127.0.0.1', 0))
+    server.settimeout(5)
+    testdir.makefile(".yml", """
+---
+- provider: metrics
+  type: record_property
+  name: first
+  expression: "1"
+  metric_type: gauge
+- provider: metrics
+  type: record_property
+  name: second
+  expression: "2"
+  metric_type: gauge
+    """)
+    try:
+        result = testdir.runpytest(
+            '--stats-d', '--stats-host', '127.0.0.1',
+            '--stats-port', str(server.getsockname()[1]),
+            '--stats-batch-size', '10')
+        result.assert_outcomes(passed=1)
+        data = server.recv(4096).decode('ascii')
+    finally:
+        server.close()
+    assert data == 'first:1|g\nsecond:2|g'
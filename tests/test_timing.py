@@ -0,0 +1,228 @@
+import json
+
+import pytest
+
+
+@pytest.mark.parametrize('spec,class_name', [
+    ('print', 'PrintSink'),
+    ('none', 'NullSink'),
+    ('ring', 'RingBufferSink'),
+    ('ring:10', 'RingBufferSink'),
+])
+def test_make_sink(spec, class_name):
+    from pytest_play.timing import make_sink
+    assert make_sink(spec).__class__.__name__ == class_name
+
+
+@pytest.mark.parametrize('spec', ['foo', 'jsonl', 'jsonl:', 'print:1',
+                                  'ring:a'])
+def test_make_sink_invalid(spec):
+    from pytest_play.timing import make_sink
+    with pytest.raises(ValueError):
+        make_sink(spec)
+
+
+def test_ring_buffer_sink(play):
+    from pytest_play.timing import RingBufferSink
+    play.timing_sink = RingBufferSink(2)
+    for i in range(3):
+        play.execute_command({
+            'provider': 'python',
+            'type': 'assert',
+            'expression': str(i + 1)})
+    records = list(play.timing_sink.records)
+    assert len(records) == 2
+    assert records[-1]['provider'] == 'python'
+    assert records[-1]['type'] == 'assert'
+    assert records[-1]['elapsed'] == play.variables['_elapsed']
+    assert records[-1]['test'] == play.request.node.nodeid
+
+
+def test_jsonl_sink(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "1"
+- provider: python
+  type: assert
+  expression: "1 == 1"
+    """)
+    timings = testdir.tmpdir.join('timings.jsonl')
+    junit_xml_file = testdir.tmpdir.join('results.xml')
+
+    result = testdir.runpytest(
+        '--play-timing-sink', 'jsonl:{0}'.format(timings),
+        '--junit-xml={0}'.format(junit_xml_file))
+
+    result.assert_outcomes(passed=1)
+    records = [json.loads(line) for line in timings.readlines()]
+    assert len(records) == 2
+    assert records[0]['test'].startswith('test_jsonl_sink.yml')
+    assert records[0]['elapsed'] > 0
+    assert '_elapsed' not in junit_xml_file.read()
+
+
+def test_sink_restored(testdir):
+    from pytest_play.timing import get_timing_sink
+    sink = get_timing_sink()
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "1"
+    """)
+    result = testdir.runpytest('--play-timing-sink', 'none')
+    result.assert_outcomes(passed=1)
+    assert get_timing_sink() is sink
+
+
+def test_sink_invalid(testdir):
+    result = testdir.runpytest('--play-timing-sink', 'foo')
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(['*Invalid --play-timing-sink option*'])
+
+
+def test_timer():
+    import time
+    from pytest_play.timing import Timer
+    timer = Timer()
+    time.sleep(0.01)
+    assert timer.stop() is timer
+    assert isinstance(timer.elapsed_ns, int)
+    assert timer.elapsed_ns >= 10000000
+    assert timer.elapsed == timer.elapsed_ns / 1e9
+    assert timer.cpu_elapsed_ns is None
+    assert timer.cpu_elapsed is None
+
+
+def test_timer_cpu():
+    from pytest_play.timing import Timer
+    timer = Timer(cpu=True).stop()
+    assert isinstance(timer.cpu_elapsed_ns, int)
+    assert timer.cpu_elapsed_ns >= 0
+
+
+def test_elapsed_variables(play):
+    play.execute_command({
+        'provider': 'python',
+        'type': 'sleep',
+        'seconds': 0.001})
+    assert isinstance(play.variables['_elapsed_ns'], int)
+    assert play.variables['_elapsed_ns'] >= 1000000
+    assert play.variables['_elapsed'] == \
+        play.variables['_elapsed_ns'] / 1e9
+    assert '_cpu_elapsed' not in play.variables
+
+
+def test_cpu_elapsed_variables(play):
+    play.measure_cpu_time = True
+    play.execute_command({
+        'provider': 'python',
+        'type': 'assert',
+        'expression': '1'})
+    assert isinstance(play.variables['_cpu_elapsed_ns'], int)
+    assert play.variables['_cpu_elapsed'] == \
+        play.variables['_cpu_elapsed_ns'] / 1e9
+    assert play.fork({}).measure_cpu_time is True
+
+
+def test_cpu_time_option(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "1"
+- provider: python
+  type: assert
+  expression: "variables['_cpu_elapsed_ns'] >= 0"
+    """)
+
+    result = testdir.runpytest('--play-cpu-time')
+
+    result.assert_outcomes(passed=1)
+
+
+@pytest.mark.parametrize('patterns,command,expected', [
+    (['*'], {'provider': 'python', 'type': 'assert'}, True),
+    (['python.*'], {'provider': 'python', 'type': 'assert'}, True),
+    (['python.exec'], {'provider': 'python', 'type': 'assert'}, False),
+    (['default.*'], {'type': 'get'}, True),
+    (['login*'], {'provider': 'python', 'type': 'assert',
+                  'comment': 'login check'}, True),
+    (['foo.*', 'python.*'], {'provider': 'python', 'type': 'assert'}, True),
+])
+def test_auto_metrics_matches(patterns, command, expected):
+    from pytest_play.timing import AutoMetrics
+    assert AutoMetrics(patterns).matches(command) is expected
+
+
+def test_auto_metrics_name():
+    import mock
+    from pytest_play.timing import AutoMetrics
+    engine = mock.MagicMock()
+    engine.request.node.name = 'test_login.yml'
+    command = {'provider': 'python', 'type': 'assert'}
+    assert AutoMetrics().metric_name(engine, command) == 'python.assert'
+    assert AutoMetrics(name='{test}.{provider}.{comment}').metric_name(
+        engine, dict(command, comment='login: check')) == \
+        'test_login.yml.python.login_check'
+    assert AutoMetrics(name='{test}.{provider}.{comment}').metric_name(
+        engine, command) == 'test_login.yml.python.'
+
+
+@pytest.mark.parametrize('patterns', ['', ' , '])
+def test_make_auto_metrics_invalid(patterns):
+    from pytest_play.timing import make_auto_metrics
+    with pytest.raises(ValueError):
+        make_auto_metrics(patterns)
+
+
+def test_auto_metrics_engine(play):
+    import mock
+    from pytest_play.timing import AutoMetrics
+    metrics = mock.MagicMock()
+    play.register_command_provider(lambda engine: metrics, 'metrics')
+    play.auto_metrics = AutoMetrics(['python.assert'])
+    play.execute_command({
+        'provider': 'python',
+        'type': 'assert',
+        'expression': '1'})
+    play.execute_command({
+        'provider': 'python',
+        'type': 'exec',
+        'expression': '1'})
+    metrics.record_property.assert_called_once_with(
+        'python.assert', mock.ANY, metric_type='timing', meas_unit='s')
+
+
+def test_auto_metrics_option(testdir):
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "1"
+- provider: python
+  type: exec
+  expression: "1"
+  comment: login
+    """)
+    junit_xml_file = testdir.tmpdir.join('results.xml')
+
+    result = testdir.runpytest(
+        '--play-auto-metrics', 'python.assert,login',
+        '--play-auto-metrics-name', '{type}_time',
+        '--junit-xml={0}'.format(junit_xml_file))
+
+    result.assert_outcomes(passed=1)
+    from xml.dom import minidom
+    xmldoc = minidom.parse(junit_xml_file.strpath)
+    names = [node.getAttribute('name')
+             for node in xmldoc.getElementsByTagName('property')]
+    assert names == ['assert_time', 'exec_time']
+
+
+def test_auto_metrics_option_invalid(testdir):
+    result = testdir.runpytest('--play-auto-metrics', ',')
+    assert result.ret != 0
+    result.stderr.fnmatch_lines(['*Invalid --play-auto-metrics option*'])
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+
+def test_waiter_fixed_poll():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(poll=0.1)
+    assert [waiter.next_delay() for i in range(3)] == [0.1, 0.1, 0.1]
+
+
+def test_waiter_backoff():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(poll=0.1, backoff=2, max_poll=0.5)
+    assert [waiter.next_delay() for i in range(5)] == pytest.approx(
+        [0.1, 0.2, 0.4, 0.5, 0.5])
+
+
+def test_waiter_jitter():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(poll=1, jitter=0.5)
+    for i in range(20):
+        assert 0.5 <= waiter.next_delay() <= 1.5
+
+
+def test_waiter_no_poll():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(poll=0, backoff=2, jitter=0.5)
+    assert waiter.next_delay() == 0
+    assert waiter.wait() is True
+    assert waiter.attempts == 2
+
+
+def test_waiter_deadline():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(timeout=0.25, poll=0.2)
+    start_time = time.monotonic()
+    assert waiter.wait() is True
+    # final attempt at the deadline, no oversleeping
+    assert waiter.wait() is True
+    assert time.monotonic() - start_time == pytest.approx(0.25, abs=0.05)
+    assert waiter.expired()
+    assert waiter.wait() is False
+    assert waiter.attempts == 3
+    assert waiter.waited == pytest.approx(0.25, abs=0.05)
+
+
+def test_waiter_no_timeout():
+    from pytest_play.waits import Waiter
+    waiter = Waiter(timeout=0, poll=0.01)
+    assert waiter.deadline is None
+    assert not waiter.expired()
+    assert waiter.wait() is True
+
+
+def test_waiter_wake():
+    from pytest_play.waits import (
+        Waiter,
+        WakeSignal,
+    )
+    signal = WakeSignal()
+    waiter = Waiter(signal, timeout=5, poll=5)
+    timer = threading.Timer(0.1, signal.notify)
+    timer.start()
+    start_time = time.monotonic()
+    assert waiter.wait() is True
+    assert time.monotonic() - start_time < 1
+    timer.join()
+
+
+def test_waiter_wake_before_wait():
+    from pytest_play.waits import (
+        Waiter,
+        WakeSignal,
+    )
+    signal = WakeSignal()
+    waiter = Waiter(signal, timeout=5, poll=5)
+    # e.g., notified while evaluating the condition
+    signal.notify()
+    start_time = time.monotonic()
+    assert waiter.wait() is True
+    assert time.monotonic() - start_time < 1
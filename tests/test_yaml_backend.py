@@ -0,0 +1,43 @@
+import pytest
+
+
+def test_yaml_backend_auto():
+    from pytest_play.config import LIBYAML
+    from pytest_play.yaml_backend import YAMLBackend
+    backend = YAMLBackend()
+    assert backend.name == (LIBYAML and 'libyaml' or 'python')
+
+
+@pytest.mark.parametrize('name', ['auto', 'python'])
+def test_yaml_backend_load_dump(name):
+    from pytest_play.yaml_backend import YAMLBackend
+    backend = YAMLBackend(name)
+    data = {'provider': 'python', 'seconds': 0.5, 'sub_commands': [1]}
+    assert backend.load(backend.dump(data)) == data
+    assert list(backend.load_all('a: 1\n---\n- 2\n')) == [{'a': 1}, [2]]
+
+
+def test_yaml_backend_not_available():
+    from pytest_play.yaml_backend import YAMLBackend
+    with pytest.raises(ValueError):
+        YAMLBackend('unknown')
+
+
+@pytest.mark.parametrize('name', ['python', 'libyaml'])
+def test_yaml_backend_header(testdir, name):
+    from pytest_play.config import LIBYAML
+    if name == 'libyaml' and not LIBYAML:
+        pytest.skip('libyaml not available')
+    testdir.makefile(".yml", """
+---
+- provider: python
+  type: assert
+  expression: "1"
+    """)
+
+    result = testdir.runpytest_subprocess(
+        '--play-yaml-backend', name)
+
+    result.assert_outcomes(passed=1)
+    result.stdout.fnmatch_lines([
+        'pytest-play: yaml backend {0}'.format(name)])